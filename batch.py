@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import catalogueHandler
+import configHandler
+import priorityHandler
+import progressHandler
+
+
+# catalogue of the current process (see initializeCatalogue)
+catalogue = None
+
+
+def initializeCatalogue(fileName):
+    # every process calculates the penalties of the catalogue once and
+    # shares them with all configurations it calculates
+    global catalogue
+    catalogue = catalogueHandler.catalogueHandler(
+        configHandler.configHandler().loadConfig(fileName))
+
+
+def solveFile(task):
+    # calculates a single configuration file and writes the results to the
+    # output directory; returns the file name and whether it succeeded
+    fileName, outputDirectory, options, metrics, binary, ratings = task
+    name = os.path.splitext(os.path.basename(fileName))[0]
+
+    result = {'configuration': os.path.basename(fileName)}
+    try:
+        handler = configHandler.configHandler()
+        configuration = handler.loadConfig(fileName)
+        if metrics:
+            options = dict(options, reporters=[progressHandler.metricsReporter(
+                os.path.join(outputDirectory, name + '.metrics.jsonl'))])
+        if catalogue is not None:
+            options = dict(options, catalogue=catalogue)
+        if ratings:
+            options = dict(options, ratingTable=os.path.join(
+                outputDirectory, name + '.ratings.bin'))
+        result['results'] = priorityHandler.solve(configuration, **options)
+        if binary:
+            handler.saveBinaryResults(
+                os.path.join(outputDirectory, name + '.results.bin'),
+                handler.getResultPositions(configuration, result['results']))
+            return fileName, True
+    except Exception as error:
+        # an invalid configuration must not stop the other calculations
+        result['error'] = str(error) or error.__class__.__name__
+        result.pop('results', None)
+
+    output = open(os.path.join(outputDirectory, name + '.json'), 'w')
+    output.write(json.dumps(result))
+    output.close()
+
+    return fileName, 'error' not in result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Calculates the priorities of all configuration files '
+                    'of a directory and saves the results as JSON.')
+    parser.add_argument('configurations', metavar='DIRECTORY',
+                        help='directory containing the configuration files '
+                             '(*.json or binary *.bin)')
+    parser.add_argument('output', metavar='OUTPUT',
+                        help='directory for the results')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='number of configurations calculated at once '
+                             '(default: number of cpus)')
+    parser.add_argument('--strategy', default='exhaustive',
+                        choices=['exhaustive', 'branch-and-bound',
+                                 'local-search', 'auto'])
+    parser.add_argument('--iterations', type=int, default=100000,
+                        help='number of moves of the local search')
+    parser.add_argument('--budget', type=float, metavar='SECONDS',
+                        help='time after which the local search stops; the '
+                             'time limit per configuration of --strategy '
+                             'auto')
+    parser.add_argument('--memory', type=float, metavar='MB',
+                        help='memory limit per configuration of --strategy '
+                             'auto')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the local search')
+    parser.add_argument('--top', type=int, default=1,
+                        help='number of best priority combinations to save')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='file caching penalties and ratings of session '
+                             'combinations')
+    parser.add_argument('--metrics', action='store_true',
+                        help='append the progress of every configuration as '
+                             'lines of JSON to OUTPUT/<name>.metrics.jsonl')
+    parser.add_argument('--catalogue', metavar='FILE',
+                        help='configuration file containing all modules of '
+                             'the configurations; the collisions of their '
+                             'sessions are calculated once and shared')
+    parser.add_argument('--binary', action='store_true',
+                        help='save the results in the binary format to '
+                             'OUTPUT/<name>.results.bin (see convert.py); '
+                             'errors are still saved as JSON')
+    parser.add_argument('--ratings', action='store_true',
+                        help='save the ratings of the session combinations '
+                             'of every configuration to '
+                             'OUTPUT/<name>.ratings.bin and map them in later '
+                             'runs')
+    arguments = parser.parse_args()
+
+    if not os.path.isdir(arguments.configurations):
+        print('invalid directory.')
+        sys.exit(1)
+    os.makedirs(arguments.output, exist_ok=True)
+    if arguments.catalogue is not None:
+        # an invalid catalogue would stop every process
+        try:
+            initializeCatalogue(arguments.catalogue)
+        except ValueError as error:
+            print(error)
+            sys.exit(1)
+
+    options = {'strategy': arguments.strategy, 'top': arguments.top,
+               'cache': arguments.cache, 'iterations': arguments.iterations,
+               'budget': arguments.budget, 'seed': arguments.seed,
+               'memory': arguments.memory}
+    tasks = [(os.path.join(arguments.configurations, fileName),
+              arguments.output, options, arguments.metrics, arguments.binary,
+              arguments.ratings)
+             for fileName in sorted(os.listdir(arguments.configurations))
+             if fileName.endswith('.json') or (
+                 fileName.endswith('.bin') and
+                 not fileName.endswith('.results.bin') and
+                 not fileName.endswith('.ratings.bin'))]
+
+    failed = 0
+    if arguments.catalogue is not None:
+        pool = multiprocessing.Pool(arguments.processes,
+                                    initializer=initializeCatalogue,
+                                    initargs=(arguments.catalogue,))
+    else:
+        pool = multiprocessing.Pool(arguments.processes)
+    try:
+        for fileName, success in pool.imap_unordered(solveFile, tasks):
+            if success:
+                print(fileName + ': done')
+            else:
+                print(fileName + ': failed')
+                failed += 1
+    finally:
+        pool.terminate()
+
+    print('Calculated {:d} configurations, {:d} failed.'.format(
+        len(tasks) - failed, failed))
+    if failed > 0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+import priorityHandler
+
+
+class benchmarkHandler(priorityHandler.priorityHandler):
+    # priority handler which measures the time of the calculation steps
+
+    def __init__(self, configuration, **options):
+        self.timings = {}
+        super().__init__(configuration, **options)
+
+    def timeStage(self, name, function, *arguments):
+        start = time.perf_counter()
+        result = function(*arguments)
+        self.timings[name] = (self.timings.get(name, 0) +
+                              time.perf_counter() - start)
+        return result
+
+    def generateAllPossibleSessionCombinations(self):
+        return self.timeStage(
+            'generateAllPossibleSessionCombinations',
+            super().generateAllPossibleSessionCombinations)
+
+    def rateSessionCombinations(self, combinations):
+        return self.timeStage('rateSessionCombinations',
+                              super().rateSessionCombinations, combinations)
+
+    def generateAllPossiblePriorityCombinations(self):
+        return self.timeStage(
+            'generateAllPossiblePriorityCombinations',
+            super().generateAllPossiblePriorityCombinations)
+
+
+def generateConfig(moduleCount, sessionCount, priorities, density, seed=0):
+    # generates a configuration in the format of configHandler.saveConfig.
+    # density (0-1) controls the collisions: with 0 the sessions are spread
+    # over all weekdays from 8:00 to 18:00, with 1 they all start within 90
+    # minutes of the same day
+    generator = random.Random(seed)
+    weekdays = max(1, round(5 - 4 * density))
+    window = int(600 - 510 * density)
+
+    modules = []
+    for module in range(moduleCount):
+        sessions = []
+        for session in range(sessionCount):
+            start = 8 * 60 + generator.randrange(0, window, 5)
+            sessions.append({'weekday': generator.randrange(weekdays),
+                             'hour': start // 60,
+                             'minute': start % 60,
+                             'duration': generator.choice([45, 90, 120]),
+                             'userPriority': generator.randrange(101)})
+        modules.append({'name': 'Module ' + str(module + 1),
+                        'sessions': sessions})
+
+    return {'settings': {'minDifference': 15, 'priorities': priorities},
+            'modules': modules}
+
+
+def runCase(configuration, options):
+    # runs in a separate process in order to measure the peak memory of a
+    # single calculation
+    start = time.perf_counter()
+    handler = benchmarkHandler(configuration, verbose=False, **options)
+    try:
+        handler.calculate()
+    finally:
+        handler.close()
+    total = time.perf_counter() - start
+
+    priorityCombinations = 1
+    for count in handler.permutationCounts:
+        priorityCombinations *= count
+
+    result = {'total': total,
+              'sessionCombinations': handler.ratings.combinationCount,
+              'priorityCombinations': priorityCombinations,
+              'peakMemory': resource.getrusage(
+                  resource.RUSAGE_SELF).ru_maxrss // 1024}
+    result.update(handler.timings)
+    return result
+
+
+def getCaseName(moduleCount, sessionCount, priorities, density):
+    return 'modules={:d} sessions={:d} priorities={:d} density={:g}'.format(
+        moduleCount, sessionCount, priorities, density)
+
+
+def printResult(name, result):
+    sessionTime = result.get('generateAllPossibleSessionCombinations', 0)
+    priorityTime = result.get('generateAllPossiblePriorityCombinations', 0)
+    print(name)
+    print('  step 1: {:8.3f}s ({:.3f}s rating), {:.0f} combinations/s'.format(
+        sessionTime, result.get('rateSessionCombinations', 0),
+        result['sessionCombinations'] / max(sessionTime, 1e-9)))
+    print('  step 2: {:8.3f}s, {:.0f} priority combinations/s'.format(
+        priorityTime,
+        result['priorityCombinations'] / max(priorityTime, 1e-9)))
+    print('  peak memory: {:d} MB'.format(result['peakMemory']))
+
+
+def compareResults(results, baseline, tolerance):
+    # returns the number of stages which are slower than in the baseline
+    regressions = 0
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for stage in ['generateAllPossibleSessionCombinations',
+                      'rateSessionCombinations',
+                      'generateAllPossiblePriorityCombinations']:
+            if stage not in result or stage not in baseline[name]:
+                continue
+            old = baseline[name][stage]
+            new = result[stage]
+            # ignore differences which are too small to be measured reliably
+            if new > old * (1 + tolerance) and new - old > 0.05:
+                print('Regression: {} {} {:.3f}s -> {:.3f}s'.format(
+                    name, stage, old, new))
+                regressions += 1
+
+    return regressions
+
+
+def parseList(value, conversion):
+    return [conversion(entry) for entry in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measures the calculation steps with synthetic '
+                    'configurations.')
+    parser.add_argument('--modules', default='3,4', help='module counts')
+    parser.add_argument('--sessions', default='3,4',
+                        help='session counts per module')
+    parser.add_argument('--priorities', default='2,3',
+                        help='numbers of priorities')
+    parser.add_argument('--density', default='0.2,0.8',
+                        help='collision densities (0-1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--strategy', default='exhaustive',
+                        choices=['exhaustive', 'branch-and-bound'])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--save-configs', metavar='DIRECTORY',
+                        help='save the generated configurations')
+    parser.add_argument('--save-baseline', metavar='FILE',
+                        help='save the results as baseline')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown compared to the baseline '
+                             '(default: 0.2)')
+    arguments = parser.parse_args()
+
+    options = {'strategy': arguments.strategy, 'workers': arguments.workers}
+    results = {}
+    # every case runs in a fresh process
+    context = multiprocessing.get_context('spawn')
+    for moduleCount, sessionCount, priorities, density in itertools.product(
+            parseList(arguments.modules, int),
+            parseList(arguments.sessions, int),
+            parseList(arguments.priorities, int),
+            parseList(arguments.density, float)):
+        name = getCaseName(moduleCount, sessionCount, priorities, density)
+        configuration = generateConfig(moduleCount, sessionCount, priorities,
+                                       density, arguments.seed)
+
+        if arguments.save_configs:
+            fileName = os.path.join(arguments.save_configs,
+                                    name.replace(' ', '_') + '.json')
+            config = open(fileName, 'w')
+            config.write(json.dumps(configuration))
+            config.close()
+
+        pool = context.Pool(1)
+        try:
+            results[name] = pool.apply(runCase, (configuration, options))
+        finally:
+            pool.terminate()
+        printResult(name, results[name])
+
+    if arguments.save_baseline:
+        baseline = open(arguments.save_baseline, 'w')
+        baseline.write(json.dumps(results, indent=1, sort_keys=True))
+        baseline.close()
+
+    if arguments.baseline:
+        baseline = open(arguments.baseline, 'r')
+        regressions = compareResults(results, json.loads(baseline.read()),
+                                     arguments.tolerance)
+        baseline.close()
+        if regressions > 0:
+            sys.exit(1)
+        print('No regressions compared to the baseline.')
+
+if __name__ == '__main__':
+    main()
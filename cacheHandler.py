@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import sqlite3
+import hashlib
+import json
+from array import array
+
+
+class cacheHandler():
+    # number of rating tables which are kept in the cache
+    maximumRatings = 10
+    # seconds to wait for other calculations writing to the same cache file
+    timeout = 60
+
+    def __init__(self, fileName):
+        self.database = sqlite3.connect(fileName, timeout=self.timeout)
+        self.cursor = self.database.cursor()
+
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS penalties
+                       (session TEXT,
+                       sessionCompare TEXT,
+                       minDifference INTEGER,
+                       penalty INTEGER,
+                       PRIMARY KEY (session, sessionCompare,
+                                    minDifference))''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS ratings
+                       (id INTEGER PRIMARY KEY,
+                       minDifference INTEGER,
+                       modules TEXT,
+                       ratings BLOB)''')
+
+    def getSessionHash(self, session, withUserPriority=True):
+        # content hash of a session; penalties only depend on the time of a
+        # session and are therefore cached without the user priority
+        content = [session['weekday'], session['hour'], session['minute'],
+                   session['duration']]
+        if withUserPriority:
+            content.append(session['userPriority'])
+        return hashlib.sha1(json.dumps(content).encode()).hexdigest()
+
+    def loadPenalties(self, minDifference):
+        self.cursor.execute('''SELECT session, sessionCompare, penalty
+                            FROM penalties WHERE minDifference=?''',
+                            [minDifference])
+        return {(session, sessionCompare): penalty
+                for session, sessionCompare, penalty in self.cursor.fetchall()}
+
+    def savePenalties(self, penalties, minDifference):
+        # penalties is a list of (session, sessionCompare, penalty)
+        self.cursor.executemany('''INSERT OR REPLACE INTO penalties
+                                (session, sessionCompare, minDifference,
+                                penalty)
+                                VALUES (?, ?, ?, ?)''',
+                                [(session, sessionCompare, minDifference,
+                                  penalty)
+                                 for session, sessionCompare, penalty
+                                 in penalties])
+        self.database.commit()
+
+    def loadRatings(self, moduleHashes, minDifference):
+        # returns the session hashes of the modules and the ratings of the
+        # cached rating table sharing the most session combinations with the
+        # given modules, or None if no combination can be reused
+        self.cursor.execute('''SELECT id, modules FROM ratings
+                            WHERE minDifference=?''', [minDifference])
+        bestId = None
+        bestModules = None
+        bestCount = 0
+        for ratingsId, modules in self.cursor.fetchall():
+            modules = json.loads(modules)
+            if len(modules) != len(moduleHashes):
+                continue
+
+            # number of session combinations which are in both tables
+            count = 1
+            for hashes, cachedHashes in zip(moduleHashes, modules):
+                count *= len(set(hashes) & set(cachedHashes))
+            if count > bestCount:
+                bestId = ratingsId
+                bestModules = modules
+                bestCount = count
+
+        if bestId is None:
+            return None
+
+        self.cursor.execute('SELECT ratings FROM ratings WHERE id=?', [bestId])
+        ratings = array('i')
+        ratings.frombytes(self.cursor.fetchone()[0])
+        return bestModules, ratings
+
+    def saveRatings(self, moduleHashes, minDifference, ratings):
+        modules = json.dumps(moduleHashes)
+        self.cursor.execute('''DELETE FROM ratings WHERE minDifference=? AND
+                            modules=?''', [minDifference, modules])
+        self.cursor.execute('''INSERT INTO ratings (minDifference, modules,
+                            ratings)
+                            VALUES (?, ?, ?)''',
+                            [minDifference, modules, ratings.tobytes()])
+
+        # only keep the most recent rating tables
+        self.cursor.execute('''DELETE FROM ratings WHERE id NOT IN
+                            (SELECT id FROM ratings ORDER BY id DESC
+                            LIMIT ?)''', [self.maximumRatings])
+        self.database.commit()
+
+    def close(self):
+        self.database.close()
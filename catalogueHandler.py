@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+from array import array
+import collections
+import itertools
+import threading
+import ratingHandler
+
+
+class catalogueHandler():
+    # number of collision tables which are kept in memory
+    maximumTables = 10
+
+    def __init__(self, catalogue=None):
+        # catalogue is a configuration (see configHandler) containing the
+        # modules students can choose from; the user priorities are ignored.
+        # The penalties of all pairs of its sessions are calculated at once,
+        # sessions which are not part of the catalogue are added when they
+        # occur
+        self.penalties = {}
+        # collision tables by minDifference and session times (see
+        # getCollisions), least recently used first
+        self.tables = collections.OrderedDict()
+        # a catalogue can be shared by calculations in several threads
+        self.lock = threading.Lock()
+        self.sessionId = 0
+
+        if catalogue is not None:
+            self.createRatings(catalogue['settings']['minDifference'],
+                               [[session for module in catalogue['modules']
+                                 for session in module['sessions']]])
+
+    def getSessionHash(self, session, withUserPriority=True):
+        # as cacheHandler.getSessionHash, the penalties are shared with the
+        # rating handlers in the same way as by a cache
+        content = (session['weekday'], session['hour'], session['minute'],
+                   session['duration'])
+        if withUserPriority:
+            content += (session['userPriority'],)
+        return content
+
+    def loadPenalties(self, minDifference):
+        # the rating handler adds the penalties of new sessions to the
+        # returned dictionary
+        with self.lock:
+            return self.penalties.setdefault(minDifference, {})
+
+    def savePenalties(self, penalties, minDifference):
+        pass
+
+    def getRatings(self, ratings):
+        # returns the ratings of all session combinations of a rating handler
+        # (in the order of the combination index). A rating is the sum of the
+        # user ratings of the sessions minus the penalties of their
+        # collisions; the collisions only depend on the times and are shared
+        # by all rating handlers with the same session times. Other rating
+        # handlers rate all combinations of their sessions once, only the
+        # penalties of the session pairs are shared with them
+        times = [[self.getSessionHash(ratings.sessions[entry], False)
+                  for entry in sessions]
+                 for sessions in ratings.moduleSessions]
+        distinctTimes = tuple([tuple(sorted(set(moduleTimes)))
+                               for moduleTimes in times])
+        collisions, strides = self.getCollisions(
+            ratings.settings['minDifference'], distinctTimes)
+
+        userRatings = [[ratings.userRatings[entry] for entry in sessions]
+                       for sessions in ratings.moduleSessions]
+        offsets = [[moduleTimes.index(time) * stride for time in sessionTimes]
+                   for moduleTimes, sessionTimes, stride in zip(
+                       distinctTimes, times, strides)]
+
+        # the last modules are combined into blocks of at most blockSize
+        # combinations which are added to each combination of the other ones
+        split = max(len(times) - 1, 0)
+        blockSize = len(times[split]) if times else 1
+        while (split > 0 and
+               blockSize * len(times[split - 1]) <= ratings.blockSize):
+            split -= 1
+            blockSize *= len(times[split])
+
+        block = list(zip(*self.combine(userRatings[split:], offsets[split:])))
+        combinationRatings = array('i')
+        for userRating, index in zip(*self.combine(userRatings[:split],
+                                                   offsets[:split])):
+            combinationRatings.extend(
+                [userRating + blockRating + collisions[index + blockIndex]
+                 for blockRating, blockIndex in block])
+
+        return combinationRatings
+
+    def combine(self, userRatings, offsets):
+        # sums of the user ratings and of the offsets of all combinations of
+        # the sessions of the given modules (the last module changes fastest)
+        sums = [0]
+        indexes = [0]
+        for moduleRatings, moduleOffsets in zip(userRatings, offsets):
+            sums = [value + userRating for value in sums
+                    for userRating in moduleRatings]
+            indexes = [index + offset for index in indexes
+                       for offset in moduleOffsets]
+        return sums, indexes
+
+    def getCollisions(self, minDifference, times):
+        # ratings of all combinations of the session times of every module
+        # without user ratings, i.e. the negative sum of their penalties, and
+        # the stride of every module within them
+        key = (minDifference, times)
+        with self.lock:
+            if key in self.tables:
+                self.tables.move_to_end(key)
+                return self.tables[key]
+
+        ratings = self.createRatings(minDifference, [
+            [{'weekday': weekday, 'hour': hour, 'minute': minute,
+              'duration': duration}
+             for weekday, hour, minute, duration in moduleTimes]
+            for moduleTimes in times])
+        collisions = array('i')
+        combinations = itertools.product(*ratings.moduleSessions)
+        while True:
+            block = list(itertools.islice(combinations, ratings.blockSize))
+            if not block:
+                break
+            collisions.extend(ratings.rateBlock(block))
+
+        with self.lock:
+            self.tables[key] = (collisions, ratings.strides)
+            while len(self.tables) > self.maximumTables:
+                self.tables.popitem(last=False)
+        return collisions, ratings.strides
+
+    def createRatings(self, minDifference, modules):
+        # rating handler of sessions without user ratings in the format of
+        # priorityHandler.modules; the penalties are shared
+        handlerModules = []
+        with self.lock:
+            for moduleId, sessions in enumerate(modules):
+                handlerSessions = []
+                for session in sessions:
+                    self.sessionId += 1
+                    handlerSessions.append(
+                        {self.sessionId: dict(session, userPriority=0)})
+                handlerModules.append(
+                    {moduleId: {'name': str(moduleId),
+                                'sessions': handlerSessions}})
+
+        return ratingHandler.ratingHandler(
+            {'minDifference': minDifference, 'priorities': 1}, handlerModules,
+            self)
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import os
+import pickle
+import sys
+import time
+
+
+class checkpointHandler():
+    # minimum number of seconds between two checkpoints
+    interval = 60
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.lastSave = time.time()
+
+    def isDue(self):
+        return time.time() - self.lastSave >= self.interval
+
+    def saveCheckpoint(self, configuration, top, position, total, results,
+                       ratings):
+        # position is the flat index of the next priority combination to rate,
+        # results the best priority combinations rated so far and ratings the
+        # ratings of all session combinations
+        state = {'configuration': configuration,
+                 'top': top,
+                 'position': position,
+                 'total': total,
+                 'results': results,
+                 'ratings': ratings.tobytes()}
+
+        # write to a temporary file first in order to never leave a broken
+        # checkpoint behind
+        temporaryFileName = self.fileName + '.tmp'
+        checkpoint = open(temporaryFileName, 'wb')
+        pickle.dump(state, checkpoint, pickle.HIGHEST_PROTOCOL)
+        checkpoint.close()
+        os.replace(temporaryFileName, self.fileName)
+
+        self.lastSave = time.time()
+
+    def loadCheckpoint(self):
+        if not os.path.isfile(self.fileName):
+            print('invalid file.')
+            sys.exit(1)
+
+        checkpoint = open(self.fileName, 'rb')
+        state = pickle.load(checkpoint)
+        checkpoint.close()
+        return state
@@ -6,14 +6,32 @@
 import sys
 import os.path
 import json
+import mmap
+import struct
+from array import array
 
 
 class configHandler():
-    modules = []
-    settings = {}
+    # binary files (see saveBinaryConfig and saveBinaryResults) start with
+    # one of these
+    configMagic = b'PRCF'
+    resultsMagic = b'PRRS'
+    ratingsMagic = b'PRRT'
+    binaryVersion = 1
+    # magic, version, unused, number of modules, number of sessions, length
+    # of the settings and length of the module names
+    configHeader = struct.Struct('<4sHHIIII')
+    # magic, version, unused, number of modules, number of results
+    resultsHeader = struct.Struct('<4sHHII')
+    # magic, version, unused, number of modules, number of session
+    # combinations and the key of the sessions (see ratingHandler.getTableKey)
+    ratingsHeader = struct.Struct('<4sHHIQ32s')
+    # the values of a session in binary files; every one is a column
+    sessionColumns = ['weekday', 'hour', 'minute', 'duration', 'userPriority']
 
     def __init__(self):
-        pass
+        self.modules = []
+        self.settings = {}
 
     def createConfig(self):
         fileName = input('Enter filename for configuration: ')
@@ -95,9 +113,10 @@ class configHandler():
             minutes -= 60
             hours += 1
 
+        # raised instead of exiting as this is also used by calculations
+        # which do not own the process
         if hours > 23:
-            print('Invalid session!')
-            sys.exit(1)
+            raise ValueError('Invalid session!')
 
         return {'hour': hours, 'minute': minutes}
 
@@ -139,5 +158,265 @@ class configHandler():
             print('invalid file.')
             sys.exit(1)
 
+        if self.getBinaryType(fileName) == self.configMagic:
+            return self.getConfigFromBinary(self.openBinaryConfig(fileName))
+
         config = open(fileName, 'r')
         return json.loads(config.read())
+
+    def getBinaryType(self, fileName):
+        # returns the magic of a binary file or None for other files
+        binary = open(fileName, 'rb')
+        magic = binary.read(4)
+        binary.close()
+        if magic in [self.configMagic, self.resultsMagic]:
+            return magic
+        return None
+
+    def saveBinaryConfig(self, fileName, configuration):
+        # the sessions of all modules are saved as columns of 32 bit integers
+        # (all weekdays, all hours, ...); the sessions of module i are the
+        # entries moduleStarts[i] to moduleStarts[i + 1] - 1
+        moduleStarts = [0]
+        columns = dict([(column, []) for column in self.sessionColumns])
+        for module in configuration['modules']:
+            for session in module['sessions']:
+                for column in self.sessionColumns:
+                    columns[column].append(session[column])
+            moduleStarts.append(moduleStarts[-1] + len(module['sessions']))
+
+        settings = json.dumps(configuration['settings']).encode('utf-8')
+        names = '\0'.join([module['name'] for module in
+                           configuration['modules']]).encode('utf-8')
+
+        binary = open(fileName, 'wb')
+        binary.write(self.configHeader.pack(
+            self.configMagic, self.binaryVersion, 0,
+            len(configuration['modules']), moduleStarts[-1], len(settings),
+            len(names)))
+        binary.write(self.packArray('i', moduleStarts))
+        for column in self.sessionColumns:
+            binary.write(self.packArray('i', columns[column]))
+        binary.write(settings)
+        binary.write(names)
+        binary.close()
+
+    def openBinaryConfig(self, fileName):
+        # maps the file into memory; the columns are returned as views of the
+        # file (without reading or parsing them)
+        mapping = self.mapFile(fileName, self.configMagic, self.configHeader)
+        magic, version, unused, moduleCount, sessionCount, settingsLength, \
+            namesLength = self.configHeader.unpack_from(mapping)
+
+        offset = self.configHeader.size
+        moduleStarts = self.getArray(mapping, offset, 'i', moduleCount + 1)
+        offset += 4 * (moduleCount + 1)
+        sessions = {}
+        for column in self.sessionColumns:
+            sessions[column] = self.getArray(mapping, offset, 'i',
+                                             sessionCount)
+            offset += 4 * sessionCount
+        settings = bytes(mapping[offset:offset + settingsLength])
+        offset += settingsLength
+        names = bytes(mapping[offset:offset + namesLength])
+
+        if (offset + namesLength != len(mapping) or
+                moduleStarts[moduleCount] != sessionCount):
+            raise ValueError('invalid file.')
+        names = names.decode('utf-8').split('\0') if moduleCount > 0 else []
+
+        return {'settings': json.loads(settings.decode('utf-8')),
+                'names': names,
+                'moduleStarts': moduleStarts,
+                'sessions': sessions}
+
+    def getConfigFromBinary(self, binary):
+        # converts an opened binary configuration to the format of loadConfig;
+        # the columns are read once and copied into the session dictionaries
+        starts = binary['moduleStarts'].tolist()
+        sessions = [dict(zip(self.sessionColumns, values)) for values in zip(
+            *[binary['sessions'][column].tolist()
+              for column in self.sessionColumns])]
+        modules = [{'name': name, 'sessions': sessions[start:stop]}
+                   for name, start, stop in zip(binary['names'], starts,
+                                                starts[1:])]
+
+        return {'settings': binary['settings'], 'modules': modules}
+
+    def saveBinaryResults(self, fileName, results):
+        # results is a list of (rating, priority lists) where every priority
+        # list contains the positions of the sessions within their module
+        # (see getResultPositions); saved as the ratings (64 bit floats), the
+        # lengths of the priority lists of all modules and the positions of
+        # all results (32 bit integers)
+        priorityCounts = []
+        if results:
+            priorityCounts = [len(priorities) for priorities in results[0][1]]
+        positions = []
+        for rating, combination in results:
+            if [len(priorities) for priorities in combination] != \
+                    priorityCounts:
+                raise ValueError('The results need to have the same number '
+                                 'of priorities.')
+            for priorities in combination:
+                positions.extend(priorities)
+
+        binary = open(fileName, 'wb')
+        binary.write(self.resultsHeader.pack(
+            self.resultsMagic, self.binaryVersion, 0, len(priorityCounts),
+            len(results)))
+        binary.write(self.packArray('d', [rating for rating, combination
+                                          in results]))
+        binary.write(self.packArray('i', priorityCounts))
+        binary.write(self.packArray('i', positions))
+        binary.close()
+
+    def loadBinaryResults(self, fileName):
+        # returns the results in the format of saveBinaryResults
+        mapping = self.mapFile(fileName, self.resultsMagic, self.resultsHeader)
+        magic, version, unused, moduleCount, resultCount = \
+            self.resultsHeader.unpack_from(mapping)
+
+        offset = self.resultsHeader.size
+        ratings = self.getArray(mapping, offset, 'd', resultCount).tolist()
+        offset += 8 * resultCount
+        priorityCounts = self.getArray(mapping, offset, 'i',
+                                       moduleCount).tolist()
+        offset += 4 * moduleCount
+        if offset + 4 * resultCount * sum(priorityCounts) != len(mapping):
+            raise ValueError('invalid file.')
+        positions = self.getArray(mapping, offset, 'i',
+                                  resultCount * sum(priorityCounts)).tolist()
+
+        results = []
+        position = 0
+        for rating in ratings:
+            combination = []
+            for count in priorityCounts:
+                combination.append(positions[position:position + count])
+                position += count
+            results.append((rating, combination))
+
+        return results
+
+    def saveBinaryRatings(self, fileName, key, moduleSizes, ratings):
+        # saves the ratings of all session combinations (see ratingHandler)
+        # as a column of 32 bit integers after the number of distinct
+        # sessions of every module; the file is replaced at once, i.e. it
+        # can be mapped by other processes while it is written
+        temporaryName = fileName + '.tmp'
+        binary = open(temporaryName, 'wb')
+        binary.write(self.ratingsHeader.pack(
+            self.ratingsMagic, self.binaryVersion, 0, len(moduleSizes),
+            len(ratings), key))
+        binary.write(self.packArray('i', moduleSizes))
+        binary.write(self.packArray('i', ratings))
+        binary.close()
+        os.replace(temporaryName, fileName)
+
+    def openBinaryRatings(self, fileName):
+        # maps a file saved by saveBinaryRatings into memory; the ratings are
+        # returned as a view of the file. The mapping is closed by
+        # closeBinaryRatings
+        mapping = self.mapFile(fileName, self.ratingsMagic,
+                               self.ratingsHeader)
+        magic, version, unused, moduleCount, combinationCount, key = \
+            self.ratingsHeader.unpack_from(mapping)
+
+        offset = self.ratingsHeader.size
+        if offset + 4 * (moduleCount + combinationCount) != len(mapping):
+            mapping.close()
+            raise ValueError('invalid file.')
+        moduleSizes = self.getArray(mapping, offset, 'i', moduleCount)
+        offset += 4 * moduleCount
+        ratings = self.getArray(mapping, offset, 'i', combinationCount)
+
+        return {'key': key, 'moduleSizes': moduleSizes, 'ratings': ratings,
+                'mapping': mapping}
+
+    def closeBinaryRatings(self, binary):
+        # the views of the file need to be released before the mapping
+        for column in ['moduleSizes', 'ratings']:
+            if isinstance(binary[column], memoryview):
+                binary[column].release()
+        binary['mapping'].close()
+
+    def getResultSessions(self, configuration, results):
+        # converts results in the format of saveBinaryResults to a list of
+        # {'rating': rating, 'modules': [{'name': name, 'priorities':
+        # [session, ...]}, ...]} where every session of the configuration is
+        # extended by its priority
+        converted = []
+        for rating, combination in results:
+            modules = []
+            for module, positions in zip(configuration['modules'],
+                                         combination):
+                priorities = []
+                for priority, position in enumerate(positions):
+                    session = dict(module['sessions'][position])
+                    session['priority'] = priority + 1
+                    priorities.append(session)
+                modules.append({'name': module['name'],
+                                'priorities': priorities})
+            converted.append({'rating': rating, 'modules': modules})
+
+        return converted
+
+    def getResultPositions(self, configuration, results):
+        # the reverse of getResultSessions; equal sessions of a module are
+        # assigned in the order of the configuration
+        converted = []
+        for result in results:
+            combination = []
+            for module, resultModule in zip(configuration['modules'],
+                                            result['modules']):
+                positions = []
+                for session in resultModule['priorities']:
+                    session = dict(session)
+                    del session['priority']
+                    for position, candidate in enumerate(module['sessions']):
+                        if candidate == session and position not in positions:
+                            positions.append(position)
+                            break
+                    else:
+                        raise ValueError('The results do not belong to the '
+                                         'configuration.')
+                combination.append(positions)
+            converted.append((result['rating'], combination))
+
+        return converted
+
+    def packArray(self, typecode, values):
+        # binary files are little endian
+        try:
+            values = array(typecode, values)
+        except (TypeError, OverflowError):
+            raise ValueError('Invalid session!')
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values.tobytes()
+
+    def getArray(self, mapping, offset, typecode, count):
+        size = array(typecode).itemsize
+        view = memoryview(mapping)[offset:offset + size * count]
+        if sys.byteorder == 'little':
+            return view.cast(typecode)
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    def mapFile(self, fileName, magic, header):
+        # maps a binary file read-only into memory after checking its header
+        binary = open(fileName, 'rb')
+        try:
+            if os.fstat(binary.fileno()).st_size < header.size:
+                raise ValueError('invalid file.')
+            mapping = mmap.mmap(binary.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            binary.close()
+
+        fileMagic, version = struct.unpack_from('<4sH', mapping)
+        if fileMagic != magic or version != self.binaryVersion:
+            mapping.close()
+            raise ValueError('invalid file.')
+        return mapping
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import argparse
+import json
+import sys
+import configHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Converts configurations and results between JSON and '
+                    'the binary format.')
+    parser.add_argument('input', metavar='INPUT',
+                        help='configuration or results (JSON or binary)')
+    parser.add_argument('output', metavar='OUTPUT',
+                        help='file for the converted configuration or '
+                             'results; binary files are converted to JSON '
+                             'and the other way round')
+    parser.add_argument('--config', metavar='FILE',
+                        help='configuration of the results (JSON or binary); '
+                             'needed to convert results')
+    arguments = parser.parse_args()
+
+    handler = configHandler.configHandler()
+    try:
+        convert(handler, arguments.input, arguments.output, arguments.config)
+    except (OSError, ValueError, KeyError) as error:
+        print(error)
+        sys.exit(1)
+
+
+def convert(handler, inputName, outputName, configName=None):
+    binaryType = handler.getBinaryType(inputName)
+    if binaryType == handler.configMagic:
+        saveJson(outputName, handler.loadConfig(inputName))
+        return
+
+    if binaryType is None:
+        content = json.loads(open(inputName, 'r').read())
+        if isinstance(content, dict) and 'modules' in content:
+            handler.saveBinaryConfig(outputName, content)
+            return
+
+    # results; the priorities are saved as positions of the sessions within
+    # the configuration
+    if configName is None:
+        raise ValueError('The configuration of the results is needed '
+                         '(--config).')
+    configuration = handler.loadConfig(configName)
+    if binaryType == handler.resultsMagic:
+        saveJson(outputName, handler.getResultSessions(
+            configuration, handler.loadBinaryResults(inputName)))
+    else:
+        # results as saved by batch.py or a list of results
+        if isinstance(content, dict):
+            content = content['results']
+        handler.saveBinaryResults(outputName, handler.getResultPositions(
+            configuration, content))
+
+
+def saveJson(fileName, content):
+    output = open(fileName, 'w')
+    output.write(json.dumps(content))
+    output.close()
+
+if __name__ == '__main__':
+    main()
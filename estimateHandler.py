@@ -0,0 +1,345 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+from array import array
+import collections
+import copy
+import itertools
+import math
+import random
+import time
+import tracemalloc
+import localSearchHandler
+import resultHandler
+import searchHandler
+
+
+class estimateHandler():
+    # number of timed operations per calibration
+    samples = 2000
+    # priority lists of a module are only enumerated (in order to count the
+    # equal and dominated ones) up to this number; otherwise all of them are
+    # counted
+    permutationLimit = 100000
+    # strategies finding the best priority combinations, preferred over the
+    # local search
+    exactStrategies = ['exhaustive', 'branch-and-bound']
+
+    def __init__(self, ratings, sessionIds, priorities, top=1, workers=1,
+                 pruneDominated=False):
+        # ratings is a ratingHandler whose session combinations have not been
+        # rated yet; the estimate only uses the sessions, the penalties and
+        # the terms of the rating
+        self.ratings = ratings
+        self.sessionIds = sessionIds
+        self.priorities = priorities
+        self.top = top
+        self.workers = workers
+        self.pruneDominated = pruneDominated
+
+        # the calibration rates with a rating table in which every session
+        # combination is rated 0 instead of the real one
+        self.calibration = copy.copy(ratings)
+        self.calibration.combinationRatings = collections.defaultdict(int)
+
+    def estimate(self, iterations=100000, budget=None):
+        # estimated time (in seconds) and memory (in bytes) of every strategy
+        # as {strategy: {'time': ..., 'memory': ..., 'count': number of
+        # priority combinations, nodes or moves, 'upperBound': whether time
+        # and count are upper bounds}}. All strategies rate all session
+        # combinations first
+        self.sessionTime = (self.ratings.combinationCount *
+                            self.timeSessionCombinations())
+        # the rating table and the penalties of all session pairs
+        self.memory = (array('i').itemsize * (self.ratings.combinationCount +
+                                              len(self.ratings.weekdays) ** 2))
+
+        estimates = {}
+        counts, exact = self.getPermutationCounts()
+        count = math.prod(counts)
+        search = self.getSearch(self.ratings)
+        resultCount = self.getResultCount(search)
+        # the results are expanded (equal sessions and priorities not
+        # affecting the rating) at the end, which holds them twice
+        resultMemory = 2 * resultCount * self.measureResults()
+        resultTime = resultCount * self.timeResults()
+
+        # the priority lists of all modules are kept during the search, by
+        # every worker as well
+        permutationMemory = sum([
+            moduleCount * size for moduleCount, size
+            in zip(counts, self.measurePermutations())])
+        memory = self.memory + resultMemory
+        if self.workers > 1:
+            # the rating table is copied to the shared memory of the workers
+            memory += array('i').itemsize * self.ratings.combinationCount
+            permutationMemory *= self.workers + 1
+        estimates['exhaustive'] = {
+            'time': self.sessionTime + count *
+            self.timePriorityCombinations() / self.workers + resultTime,
+            'memory': memory + permutationMemory, 'count': count,
+            'upperBound': not exact}
+
+        # the number of nodes without pruning is an upper bound
+        nodes = self.getNodeCount(search)
+        estimates['branch-and-bound'] = {
+            'time': self.sessionTime + nodes * self.timeNodes() + resultTime,
+            'memory': self.memory + resultMemory +
+            self.getCacheEntryCount(search, nodes) * self.measureNodes(),
+            'count': nodes, 'upperBound': True}
+
+        moveTime = iterations * self.timeMoves()
+        if budget is not None:
+            moveTime = min(moveTime, budget)
+        estimates['local-search'] = {
+            'time': self.sessionTime + moveTime, 'memory': self.memory,
+            'count': iterations, 'upperBound': False}
+
+        return estimates
+
+    def selectStrategy(self, estimates, timeLimit=None, memoryLimit=None):
+        # returns the strategy to use and the reason. The faster one of the
+        # strategies finding the best priority combinations is used if it
+        # fits both limits (in seconds and bytes); otherwise the local search
+        # runs for the remaining time
+        fitting = [strategy for strategy in self.exactStrategies
+                   if self.fits(estimates[strategy], timeLimit, memoryLimit)]
+        if fitting:
+            return (min(fitting,
+                        key=lambda strategy: estimates[strategy]['time']),
+                    'it is the faster one of the strategies finding the best '
+                    'priority combinations within the limits')
+
+        if memoryLimit is not None and self.memory > memoryLimit:
+            return ('local-search',
+                    'no strategy is expected to fit the memory limit')
+        return ('local-search', 'the best priority combinations cannot be '
+                'searched within the limits')
+
+    def getReport(self, estimates):
+        # lines describing the estimates
+        units = {'exhaustive': 'priority combinations',
+                 'branch-and-bound': 'nodes',
+                 'local-search': 'moves'}
+        lines = ['Estimated for {:d} session combinations ({:.1f}s):'.format(
+            self.ratings.combinationCount, self.sessionTime)]
+        for strategy, estimate in estimates.items():
+            prefix = 'at most ' if estimate['upperBound'] else ''
+            lines.append('  {}: {}{}, {:.1f} MB ({}{:d} {})'.format(
+                strategy, prefix, self.formatTime(estimate['time']),
+                estimate['memory'] / 1024 / 1024, prefix, estimate['count'],
+                units[strategy]))
+        return lines
+
+    def formatTime(self, seconds):
+        if seconds < 60:
+            return '{:.1f}s'.format(seconds)
+        if seconds < 86400:
+            return '{:d}:{:02d}:{:02d}'.format(int(seconds // 3600),
+                                               int(seconds % 3600 // 60),
+                                               int(seconds % 60))
+        return '{:.3g} days'.format(seconds / 86400)
+
+    def fits(self, estimate, timeLimit, memoryLimit):
+        return ((timeLimit is None or estimate['time'] <= timeLimit) and
+                (memoryLimit is None or estimate['memory'] <= memoryLimit))
+
+    def getPermutationCounts(self):
+        # number of priority lists of every module rated by the exhaustive
+        # search and whether they are exact (see
+        # ratingHandler.getPermutations)
+        counts = []
+        exact = True
+        for module, sessions in enumerate(self.sessionIds):
+            length = min(self.priorities, len(sessions))
+            if math.perm(len(sessions), length) > self.permutationLimit:
+                counts.append(math.perm(len(sessions), length))
+                exact = False
+                continue
+            counts.append(len(self.ratings.getPermutations(
+                module, sessions, self.priorities, self.pruneDominated)))
+        return counts, exact
+
+    def getResultCount(self, search):
+        # number of results kept by the exact strategies: every priority
+        # combination is rated the same as all priority combinations which
+        # only differ in the priorities not affecting the rating, all of
+        # them are kept. Further equally rated combinations are not known
+        # before rating, i.e. this is a lower bound
+        ties = search.getTieCount()
+        return -(-self.top // ties) * ties
+
+    def getNodeCount(self, search):
+        # number of nodes of the branch-and-bound search if nothing is
+        # pruned; every variable (priority of a module, see searchHandler)
+        # has one child per session without a priority
+        assigned = [0] * len(self.sessionIds)
+        nodes = 1
+        level = 1
+        for module, priority in search.variables:
+            level *= max(len(self.sessionIds[module]) - assigned[module], 0)
+            assigned[module] += 1
+            nodes += level
+        return nodes
+
+    def getCacheEntryCount(self, search, nodes):
+        # number of values cached by the branch-and-bound search (see
+        # searchHandler.getKnownValue and getSessionValues): at most one per
+        # node and term (and module), and at most one per partial session
+        # combination in which every module has a session or none
+        modules = len(self.sessionIds)
+        keys = math.prod([len(sessions) + 1 for sessions in self.sessionIds])
+        terms = len(search.terms)
+        return (min(nodes * terms, keys) +
+                min(nodes * terms * modules, keys * modules))
+
+    def getSearch(self, ratings):
+        return searchHandler.searchHandler(ratings, self.sessionIds,
+                                           self.priorities,
+                                           self.pruneDominated)
+
+    def measureMemory(self, function):
+        # returns the result of function and the bytes it allocated at most.
+        # While a profiler traces the memory (see profileHandler), its peak
+        # is kept and only the bytes still allocated by the result are
+        # measured
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+            return result, peak - before
+        return result, current - before
+
+    def timeSessionCombinations(self):
+        # seconds per session combination
+        if self.ratings.combinationCount == 0:
+            return 0
+        generator = random.Random(0)
+        combinations = [tuple([generator.choice(sessions)
+                               for sessions in self.ratings.moduleSessions])
+                        for sample in range(self.samples)]
+
+        start = time.perf_counter()
+        self.ratings.rateBlock(combinations)
+        return (time.perf_counter() - start) / len(combinations)
+
+    def getSampleCombinations(self):
+        # priority combinations (as rated by
+        # priorityHandler.ratePriorityCombinations) of the first priority
+        # lists of every module
+        permutations = []
+        for sessions in self.sessionIds:
+            permutations.append([
+                (permutation, self.calibration.getOffsets(permutation), 1)
+                for permutation in itertools.islice(itertools.permutations(
+                    sessions, r=min(self.priorities, len(sessions))), 50)])
+        return list(itertools.islice(itertools.product(*permutations),
+                                     self.samples))
+
+    def timePriorityCombinations(self):
+        # seconds per priority combination as in
+        # priorityHandler.ratePriorityCombinations
+        combinations = self.getSampleCombinations()
+        results = resultHandler.resultHandler(self.top)
+        start = time.perf_counter()
+        for priorityCombination in combinations:
+            results.saveResult(
+                self.calibration.ratePriorityCombination(
+                    [permutation[1] for permutation in priorityCombination]),
+                tuple([permutation[0] for permutation in priorityCombination]),
+                math.prod([permutation[2]
+                           for permutation in priorityCombination]))
+        return (time.perf_counter() - start) / max(len(combinations), 1)
+
+    def saveResults(self, combinations):
+        # keeps all combinations as results, as when expanding the results
+        results = resultHandler.resultHandler(len(combinations))
+        for priorityCombination in combinations:
+            results.saveResult(0, tuple([
+                tuple(permutation[0]) for permutation in priorityCombination]))
+        return results.getResults()
+
+    def timeResults(self):
+        # seconds per expanded result
+        combinations = self.getSampleCombinations()
+        start = time.perf_counter()
+        self.saveResults(combinations)
+        return (time.perf_counter() - start) / max(len(combinations), 1)
+
+    def measureResults(self):
+        # bytes per kept result
+        combinations = self.getSampleCombinations()
+        results, size = self.measureMemory(
+            lambda: self.saveResults(combinations))
+        return size / max(len(combinations), 1)
+
+    def measurePermutations(self):
+        # bytes per priority list of every module, measured with its first
+        # priority lists
+        sizes = []
+        for module, sessions in enumerate(self.sessionIds):
+            permutations, size = self.measureMemory(
+                lambda: self.ratings.getPermutations(
+                    module, sessions, self.priorities, False, self.samples))
+            sizes.append(size / max(len(permutations), 1))
+        return sizes
+
+    def getCalibrationSearch(self):
+        # branch-and-bound search with empty caches whose assignment is a
+        # node in the middle of the search tree, together with the variable
+        # of the children of that node; None if there are no variables
+        search = self.getSearch(self.calibration)
+        search.knownValues = {}
+        search.sessionValues = {}
+        search.assignment = [[None] * used for used in search.usedPriorities]
+        if not search.variables:
+            return None
+
+        depth = len(search.variables) // 2
+        for module, priority in search.variables[:depth + 1]:
+            search.assignment[module][priority] = priority
+        return search, search.variables[depth]
+
+    def calculateBounds(self, search, variable):
+        # calculates the bounds of samples children of a node
+        module, priority = variable
+        sessions = len(self.sessionIds[module])
+        for sample in range(self.samples):
+            search.assignment[module][priority] = sample % sessions
+            search.getBound()
+
+    def timeNodes(self):
+        # seconds per node of the branch-and-bound search, measured with the
+        # bounds of the children of a node in the middle of the search tree
+        calibration = self.getCalibrationSearch()
+        if calibration is None:
+            return 0
+        start = time.perf_counter()
+        self.calculateBounds(*calibration)
+        return (time.perf_counter() - start) / self.samples
+
+    def measureNodes(self):
+        # bytes per value cached by the branch-and-bound search, measured
+        # with the same bounds as timeNodes
+        calibration = self.getCalibrationSearch()
+        if calibration is None:
+            return 0
+        search = calibration[0]
+        unused, size = self.measureMemory(
+            lambda: self.calculateBounds(*calibration))
+        return size / max(len(search.knownValues) +
+                          len(search.sessionValues), 1)
+
+    def timeMoves(self):
+        # seconds per move of the local search
+        search = localSearchHandler.localSearchHandler(
+            self.calibration, self.sessionIds, self.priorities)
+        start = time.perf_counter()
+        search.search(self.top, self.samples)
+        return (time.perf_counter() - start) / self.samples
@@ -0,0 +1,243 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import math
+import random
+import time
+import resultHandler
+
+
+class localSearchHandler():
+    # number of moves after which the time is checked
+    checkInterval = 100
+    # number of random moves used to estimate the initial temperature
+    sampleMoves = 100
+    # initial temperature relative to the average rating change of a move
+    temperatureFactor = 3
+    # temperature at the end of each run relative to the initial one
+    finalTemperature = 0.001
+    # number of runs; every run starts again from the best priority
+    # combination found so far
+    runs = 4
+
+    def __init__(self, ratings, sessionIds, priorities, seed=0):
+        self.ratings = ratings
+        # session ids of every module in the order of getSessionIdsOfModule
+        self.sessionIds = sessionIds
+        self.priorities = [min(priorities, len(sessions))
+                           for sessions in sessionIds]
+        # only the first priorities of a module affect the rating; the
+        # search only changes these
+        self.usedPriorities = self.ratings.usedPriorities
+        self.random = random.Random(seed)
+
+        # modules whose priority lists can be changed
+        self.movableModules = [
+            module for module, used in enumerate(self.usedPriorities)
+            if used >= 2 or (used >= 1 and len(sessionIds[module]) > used)]
+
+    def search(self, top=1, iterations=100000, budget=None, progress=None):
+        # simulated annealing over the priority lists of all modules, split
+        # into several runs. The temperature decreases with the number of
+        # moves, i.e. the result only depends on the seed unless the budget
+        # (in seconds) is reached or the search is interrupted. Returns the
+        # best priority combinations found
+        self.results = resultHandler.resultHandler(top)
+        # priority combinations which are currently saved in the results
+        self.saved = set()
+        # best priority combination found so far
+        self.best = None
+        self.bestRating = None
+        self.moves = 0
+        self.acceptedMoves = 0
+
+        self.initializeAssignment()
+        rating = self.rateAssignment()
+        self.saveAssignment(rating)
+        self.saveBest(rating)
+
+        startTime = time.time()
+        if progress is not None:
+            progress.start('localSearch', iterations)
+        try:
+            runMoves = max(iterations // self.runs, 1)
+            cooling = math.pow(self.finalTemperature, 1 / runMoves)
+            while self.moves < iterations and self.movableModules:
+                if self.moves % runMoves == 0:
+                    # start the next run from the best priority combination
+                    # found so far after improving it as far as possible
+                    self.restoreAssignment(self.best)
+                    rating = self.improveAssignment(self.bestRating)
+                    temperature = self.getInitialTemperature(rating)
+
+                self.moves += 1
+                move = self.move()
+                newRating = self.rateAssignment()
+                delta = newRating - rating
+                if delta >= 0 or (temperature > 0 and self.random.random() <
+                                  math.exp(delta / temperature)):
+                    rating = newRating
+                    self.acceptedMoves += 1
+                    self.saveAssignment(rating)
+                    self.saveBest(rating)
+                else:
+                    self.applyMove(*move)
+                temperature *= cooling
+
+                if self.moves % self.checkInterval == 0:
+                    if progress is not None:
+                        progress.update(self.moves, self.results.bestRating)
+                    if (budget is not None and
+                            time.time() - startTime >= budget):
+                        break
+            # the best priority combination found is improved once more
+            self.restoreAssignment(self.best)
+            self.improveAssignment(self.bestRating)
+        except KeyboardInterrupt:
+            # the best priority combinations found so far are returned
+            pass
+        if progress is not None:
+            progress.finish(self.moves, self.results.bestRating)
+
+        return self.getResults()
+
+    def initializeAssignment(self):
+        # start with the sessions with the highest user ratings
+        self.assignment = []
+        self.free = []
+        self.offsets = []
+        for module, sessionIds in enumerate(self.sessionIds):
+            userRatings = [
+                self.ratings.userRatings[self.ratings.sessionIndex[
+                    sessionId[0]]] for sessionId in sessionIds]
+            sessions = sorted(range(len(sessionIds)),
+                              key=lambda session: -userRatings[session])
+            used = self.usedPriorities[module]
+            self.assignment.append(sessions[:used])
+            self.free.append(sessions[used:])
+            self.offsets.append(self.getModuleOffsets(module))
+
+    def restoreAssignment(self, assignment):
+        for module, used in enumerate(assignment):
+            sessions = set(used)
+            self.assignment[module] = list(used)
+            self.free[module] = [
+                session for session in range(len(self.sessionIds[module]))
+                if session not in sessions]
+            self.offsets[module] = self.getModuleOffsets(module)
+
+    def getModuleOffsets(self, module):
+        return tuple([self.ratings.offsets[self.sessionIds[module][session][0]]
+                      for session in self.assignment[module]])
+
+    def rateAssignment(self):
+        return self.ratings.ratePriorityCombination(self.offsets)
+
+    def move(self):
+        # applies a random move, i.e. either exchanges a session of a
+        # priority with a session without a priority or swaps the sessions of
+        # two priorities; returns the module and the move
+        module = self.random.choice(self.movableModules)
+        used = self.assignment[module]
+        free = self.free[module]
+
+        if free and (len(used) < 2 or self.random.random() < 0.5):
+            move = (used, self.random.randrange(len(used)),
+                    free, self.random.randrange(len(free)))
+        else:
+            first, second = self.random.sample(range(len(used)), 2)
+            move = (used, first, used, second)
+
+        self.applyMove(module, move)
+        return module, move
+
+    def improveAssignment(self, rating):
+        # applies the best of all possible moves as long as it increases the
+        # rating; returns the final rating
+        while True:
+            bestMove = None
+            bestRating = rating
+            for module in self.movableModules:
+                for move in self.getMoves(module):
+                    self.applyMove(module, move)
+                    newRating = self.rateAssignment()
+                    if newRating > bestRating:
+                        bestMove = (module, move)
+                        bestRating = newRating
+                    self.applyMove(module, move)
+            if bestMove is None:
+                return rating
+
+            self.applyMove(*bestMove)
+            rating = bestRating
+            self.saveAssignment(rating)
+            self.saveBest(rating)
+
+    def getMoves(self, module):
+        # all moves of a module; a move is (first list, first position,
+        # second list, second position) of two sessions which are swapped
+        used = self.assignment[module]
+        free = self.free[module]
+        moves = [(used, first, free, second)
+                 for first in range(len(used)) for second in range(len(free))]
+        moves.extend([(used, first, used, second)
+                      for first in range(len(used))
+                      for second in range(first + 1, len(used))])
+        return moves
+
+    def applyMove(self, module, move):
+        # applying a move a second time undoes it
+        first, firstPosition, second, secondPosition = move
+        first[firstPosition], second[secondPosition] = (
+            second[secondPosition], first[firstPosition])
+        self.offsets[module] = self.getModuleOffsets(module)
+
+    def saveBest(self, rating):
+        if self.bestRating is None or rating > self.bestRating:
+            self.best = tuple([tuple(used) for used in self.assignment])
+            self.bestRating = rating
+
+    def getInitialTemperature(self, rating):
+        # based on the average rating change of random moves, i.e. most worse
+        # moves are accepted at the beginning
+        if not self.movableModules:
+            return 0
+        changes = []
+        for sample in range(self.sampleMoves):
+            move = self.move()
+            changes.append(abs(self.rateAssignment() - rating))
+            self.applyMove(*move)
+        return self.temperatureFactor * sum(changes) / len(changes)
+
+    def saveAssignment(self, rating):
+        threshold = self.results.getThreshold()
+        if threshold is not None and rating < threshold:
+            return
+
+        combination = tuple([tuple(used) for used in self.assignment])
+        if combination in self.saved:
+            return
+        self.results.saveResult(rating, combination)
+        self.saved.add(combination)
+
+        # forget the priority combinations which have been dropped from the
+        # results
+        if len(self.saved) > 2 * len(self.results.results) + 1000:
+            self.saved = set([combination for rating, combination
+                              in self.results.getResults()])
+
+    def getResults(self):
+        return [(rating, tuple([self.getPriorityList(module, used)
+                                for module, used in enumerate(combination)]))
+                for rating, combination in self.results.getResults()]
+
+    def getPriorityList(self, module, used):
+        # the priorities not affecting the rating are given to the remaining
+        # sessions in their order
+        remaining = [session for session in range(len(self.sessionIds[module]))
+                     if session not in used]
+        return tuple([self.sessionIds[module][session] for session in
+                      list(used) +
+                      remaining[:self.priorities[module] - len(used)]])
@@ -3,18 +3,145 @@
 # Licensed under the Apache License, Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
 
+import argparse
+import sys
+import checkpointHandler
 import configHandler
 import priorityHandler
+import profileHandler
+import progressHandler
 
 
 def main():
-    userInput = input('[c] Create new config [l] load config: ')
-    if userInput[::1] == 'c':
-        configHandler.configHandler().createConfig()
-    else:
-        fileName = input('Enter configuration file name: ')
-        configuration = configHandler.configHandler().loadConfig(fileName)
-        priorityHandler.priorityHandler(configuration)
+    parser = argparse.ArgumentParser(
+        description='Generates priority lists for modules with multiple '
+                    'session alternatives.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes rating the priority '
+                             'combinations (default: 1)')
+    parser.add_argument('--strategy', default='exhaustive',
+                        choices=['exhaustive', 'branch-and-bound',
+                                 'local-search', 'auto'],
+                        help='how the best priority combination is searched; '
+                             'auto chooses by estimating the time and memory '
+                             'of the other ones (default: exhaustive)')
+    parser.add_argument('--top', type=int, default=1,
+                        help='number of best priority combinations to show; '
+                             'equally rated ones are always shown '
+                             '(default: 1)')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='file caching penalties and ratings of session '
+                             'combinations between runs')
+    parser.add_argument('--ratings', metavar='FILE',
+                        help='binary file of the ratings of all session '
+                             'combinations; it is mapped into memory if it '
+                             'belongs to the configuration and written '
+                             'otherwise')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help='file to which the progress is saved regularly '
+                             'in order to resume an interrupted calculation')
+    parser.add_argument('--iterations', type=int, default=100000,
+                        help='number of moves of the local search '
+                             '(default: 100000)')
+    parser.add_argument('--budget', type=float, metavar='SECONDS',
+                        help='time after which the local search stops; the '
+                             'time limit of --strategy auto')
+    parser.add_argument('--memory', type=float, metavar='MB',
+                        help='memory limit of --strategy auto')
+    parser.add_argument('--estimate', action='store_true',
+                        help='only show the estimated time and memory of all '
+                             'strategies')
+    parser.add_argument('--profile', action='store_true',
+                        help='show the time and the number of calls of all '
+                             'calculation steps (use a single worker)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='show the memory allocated by the calculation '
+                             'steps as well (slow)')
+    parser.add_argument('--profile-dump', metavar='FILE',
+                        help='save the cProfile statistics to FILE (see '
+                             'pstats)')
+    parser.add_argument('--profile-samples', metavar='FILE',
+                        help='save sampled call stacks to FILE in the '
+                             'collapsed format of flame graphs')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the local search (default: 0)')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='file to which the progress is appended as '
+                             'lines of JSON')
+    arguments = parser.parse_args()
+    if arguments.top < 1:
+        parser.error('--top needs to be at least 1')
+    if arguments.workers < 1:
+        parser.error('--workers needs to be at least 1')
+
+    userInput = input('[c] Create new config [l] load config '
+                      '[r] resume from checkpoint: ')
+    reporters = []
+    if arguments.metrics:
+        reporters.append(progressHandler.metricsReporter(arguments.metrics))
+    profile = None
+    if (arguments.profile or arguments.profile_memory or
+            arguments.profile_dump or arguments.profile_samples):
+        profile = profileHandler.profileHandler(arguments.profile_memory,
+                                                arguments.profile_dump,
+                                                arguments.profile_samples)
+    try:
+        if userInput[::1] == 'c':
+            configHandler.configHandler().createConfig()
+        elif userInput[::1] == 'r':
+            fileName = input('Enter checkpoint file name: ')
+            resume(fileName, arguments.workers, reporters=reporters,
+                   profile=profile)
+        else:
+            fileName = input('Enter configuration file name: ')
+            configuration = configHandler.configHandler().loadConfig(fileName)
+            calculate(configuration, arguments.estimate, profile,
+                      workers=arguments.workers, strategy=arguments.strategy,
+                      top=arguments.top, cache=arguments.cache,
+                      ratingTable=arguments.ratings,
+                      checkpoint=arguments.checkpoint, reporters=reporters,
+                      iterations=arguments.iterations, budget=arguments.budget,
+                      seed=arguments.seed, memory=arguments.memory)
+    except ValueError as error:
+        # invalid sessions
+        print(error)
+        sys.exit(1)
+
+
+def calculate(configuration, estimate=False, profile=None, **options):
+    handler = None
+    if profile is not None:
+        # the profile includes the creation of the handler
+        profile.start()
+    try:
+        if profile is None:
+            handler = priorityHandler.priorityHandler(configuration, **options)
+        else:
+            handler = profileHandler.profiledHandler(configuration, profile,
+                                                     **options)
+        if estimate:
+            handler.estimate()
+            return
+        handler.calculate()
+        # print all priority combinations
+        handler.printAllPriotyCombinations()
+    finally:
+        if handler is not None:
+            handler.close()
+        if profile is not None:
+            profile.stop()
+            print('')
+            for line in profile.getReport():
+                print(line)
+
+
+def resume(fileName, workers=1, reporters=None, profile=None):
+    # continues an interrupted calculation; the configuration and the
+    # progress are read from the checkpoint which is updated further on
+    state = checkpointHandler.checkpointHandler(fileName).loadCheckpoint()
+    calculate(state['configuration'], profile=profile, workers=workers,
+              top=state['top'], checkpoint=fileName, resume=state,
+              reporters=reporters)
 
 if __name__ == '__main__':
     main()
@@ -4,42 +4,277 @@
 # you may not use this file except in compliance with the License.
 
 import sqlite3
+import copy
+import heapq
 import itertools
-import json
 import math
-import configHandler
+import multiprocessing
 import time
-import sys
+import configHandler
+import cacheHandler
+import checkpointHandler
+import estimateHandler
+import localSearchHandler
+import progressHandler
+import ratingHandler
+import resultHandler
+import searchHandler
+
+
+# state of a worker process of the parallel priority combination rating; it is
+# set once per process by initializeWorker
+workerState = {}
+
+
+def initializeWorker(ratings, sharedRatings, sessionIds, priorities, top,
+                     pruneDominated):
+    # the ratings of the session combinations are attached from the shared
+    # memory of the main process (or mapped from its rating table) instead
+    # of being copied
+    ratings.attachRatings(sharedRatings)
+    workerState['ratings'] = ratings
+    workerState['top'] = top
+    # the permutations are generated in the same order as in the serial path
+    workerState['permutations'] = [
+        ratings.getPermutations(module, sessions, priorities, pruneDominated)
+        for module, sessions in enumerate(sessionIds)]
+
+
+def rateShard(shard):
+    # rates all priority combinations of a shard (a range of the flat index
+    # of the priority combination product) and returns the best ones with
+    # their ratings
+    start, stop = shard
+    ratings = workerState['ratings']
+    results = resultHandler.resultHandler(workerState['top'])
+    for priorityCombination in iterateShard(workerState['permutations'],
+                                            start, stop):
+        results.saveResult(
+            ratings.ratePriorityCombination(
+                [permutation[1] for permutation in priorityCombination]),
+            tuple([permutation[0] for permutation in priorityCombination]),
+            math.prod([permutation[2]
+                       for permutation in priorityCombination]))
+
+    return results.getResults(True)
+
+
+def iterateShard(permutations, start, stop):
+    # decode the start index into one permutation index per module (the last
+    # module changes fastest as in itertools.product)
+    counts = [len(modulePermutations) for modulePermutations in permutations]
+    digits = []
+    remainder = start
+    for count in reversed(counts):
+        digits.insert(0, remainder % count)
+        remainder //= count
+    current = [permutations[i][digit] for i, digit in enumerate(digits)]
+
+    for index in range(start, stop):
+        yield tuple(current)
+
+        # increment the digits like an odometer
+        position = len(digits) - 1
+        while position >= 0:
+            digits[position] += 1
+            if digits[position] < counts[position]:
+                current[position] = permutations[position][digits[position]]
+                break
+            digits[position] = 0
+            current[position] = permutations[position][0]
+            position -= 1
+
+
+def solve(configuration, **options):
+    # calculates the priorities of a configuration without any output and
+    # returns the results (see priorityHandler.getResults); options are the
+    # keyword arguments of priorityHandler. All state of a calculation belongs
+    # to its handler, so solve can be called from several threads at once
+    options['verbose'] = False
+    handler = priorityHandler(configuration, **options)
+    try:
+        return handler.calculate()
+    finally:
+        handler.close()
 
 
 class priorityHandler():
-    database = sqlite3.connect(':memory:')
-    cursor = database.cursor()
-    modules = []
-    settings = {}
-    totalCombinationsInCurrentStep = 0
-
-    def __init__(self, configuration):
+    # number of shards per worker process when rating priority combinations in
+    # parallel; more shards than workers balance the load between them
+    shardsPerWorker = 8
+    # maximum number of priority combinations for which the gap of the local
+    # search to the best rating is calculated
+    exactLimit = 1000000
+    # maximum number of equally rated priority combinations which are kept
+    # when the results are expanded (see expandResults)
+    tieLimit = 100000
+    # with the strategy 'auto', branch-and-bound is tried first for this share
+    # of the time of the selected strategy (its estimate is an upper bound
+    # which is usually far too high)
+    trialShare = 0.5
+
+    def __init__(self, configuration, workers=1, strategy='exhaustive', top=1,
+                 cache=None, checkpoint=None, resume=None, verbose=True,
+                 reporters=None, iterations=100000, budget=None, seed=0,
+                 memory=None, catalogue=None, ratingTable=None):
+        # every handler has its own database, i.e. multiple configurations
+        # can be calculated one after another in the same process
+        self.database = sqlite3.connect(':memory:')
+        self.cursor = self.database.cursor()
+        self.modules = []
+
+        if workers < 1:
+            raise ValueError('The number of workers needs to be at least 1.')
+        self.workers = workers
+        # with the strategy 'auto', the strategy is chosen by estimating the
+        # time and memory (see selectStrategy); budget (in seconds) and
+        # memory (in MB) are the limits then
+        self.strategy = strategy
+        self.memory = memory
+        self.estimates = None
+        # time for which branch-and-bound is tried before the selected
+        # strategy (see selectStrategy)
+        self.trialTime = None
+        # options of the local search (see localSearchHandler.search); gap
+        # is the difference of its best rating to the best possible rating
+        # if that is known
+        self.iterations = iterations
+        self.budget = budget
+        self.seed = seed
+        self.gap = None
+        # set if not all equally rated priority combinations are kept
+        self.truncated = False
+        # print the progress and the steps of the calculation
+        self.verbose = verbose
+        # progress reporters (see progressHandler), the terminal shows the
+        # progress if verbose
+        reporters = list(reporters or [])
+        if verbose:
+            reporters.append(progressHandler.terminalReporter())
+        self.progress = progressHandler.progressHandler(reporters)
+        self.results = resultHandler.resultHandler(top)
+        # dominated sessions can only be left out when searching the best
+        # priority combinations (see ratingHandler.isDominated)
+        self.pruneDominated = top == 1
+        # persistent cache of penalties and ratings (optional)
+        self.cache = None
+        if cache is not None:
+            self.cache = cacheHandler.cacheHandler(cache)
+        # checkpoints of the rating of the priority combinations (optional);
+        # resume is the state of a loaded checkpoint
+        self.checkpoint = None
+        if checkpoint is not None:
+            self.checkpoint = checkpointHandler.checkpointHandler(checkpoint)
+        self.resume = resume
+        # catalogue sharing penalties and collisions with the calculations
+        # of other students (see catalogueHandler, optional)
+        self.catalogue = catalogue
+        # binary file of the ratings of all session combinations which is
+        # mapped if it belongs to the configuration and written otherwise
+        # (see ratingHandler.loadRatingTable, optional)
+        self.ratingTable = ratingTable
         self.populateDb()
 
+        self.configuration = configuration
         self.settings = configuration['settings']
 
         # fill tables with modules from configuration
         self.populateTables(configuration['modules'])
 
-        self.generateAllPossibleSessionCombinations()
+        # precalculate session data and the penalties of all session pairs
+        self.ratings = self.createRatings()
+
+    def createRatings(self):
+        # the penalties are taken from the catalogue or the cache
+        if self.catalogue is not None:
+            return ratingHandler.ratingHandler(self.settings, self.modules,
+                                               self.catalogue)
+        return ratingHandler.ratingHandler(self.settings, self.modules,
+                                           self.cache)
+
+    def calculate(self):
+        if self.strategy == 'auto':
+            self.selectStrategy()
 
         # iterate through all possible combinations and generate ratings
-        self.rateSessionCombinations()
+        self.generateAllPossibleSessionCombinations()
 
         # generate all possible priority combinations
         self.generateAllPossiblePriorityCombinations()
 
-        # print all priority combinations
-        self.printAllPriotyCombinations()
-
-        # close database connection
+        return self.getResults()
+
+    def estimate(self):
+        # estimates the time and memory of all strategies before anything is
+        # calculated (see estimateHandler.estimate)
+        sessionIds = [self.getSessionIdsOfModule(list(module.keys())[0])
+                      for module in self.modules]
+        estimate = estimateHandler.estimateHandler(
+            self.ratings, sessionIds, self.settings['priorities'],
+            self.results.top, self.workers, self.pruneDominated)
+        budget = None if self.strategy == 'auto' else self.budget
+        self.estimates = estimate.estimate(self.iterations, budget)
+        for line in estimate.getReport(self.estimates):
+            self.log(line)
+
+        return estimate
+
+    def selectStrategy(self):
+        estimate = self.estimate()
+        memory = None
+        if self.memory is not None:
+            memory = self.memory * 1024 * 1024
+        self.strategy, reason = estimate.selectStrategy(self.estimates,
+                                                        self.budget, memory)
+        self.log('Using {}: {}'.format(self.strategy, reason))
+
+        if self.strategy == 'local-search' and self.budget is not None:
+            # the local search stops in time to keep the time limit
+            self.budget = max(self.budget - estimate.sessionTime, 0)
+
+        # the rating of the session combinations is the same for all
+        # strategies; afterwards, branch-and-bound is tried for a part of the
+        # time of the selected strategy if it fits the memory
+        if (self.strategy != 'branch-and-bound' and
+                estimate.fits(self.estimates['branch-and-bound'], None,
+                              memory)):
+            if self.strategy == 'local-search' and self.budget is not None:
+                strategyTime = self.budget
+            else:
+                strategyTime = (self.estimates[self.strategy]['time'] -
+                                estimate.sessionTime)
+            self.trialTime = self.trialShare * strategyTime
+
+    def tryBranchAndBound(self):
+        # returns whether branch-and-bound found the results within the
+        # trial time; otherwise the selected strategy keeps the remaining
+        # time
+        self.log('Trying branch-and-bound for up to {:.1f}s'.format(
+            self.trialTime))
+        startTime = time.time()
+        if self.ratePriorityCombinationsBranchAndBound(self.trialTime):
+            self.log('Using branch-and-bound: it finished within {:.1f}s'
+                     .format(time.time() - startTime))
+            self.strategy = 'branch-and-bound'
+            return True
+
+        self.log('Branch-and-bound did not finish in time, using ' +
+                 self.strategy)
+        if self.strategy == 'local-search' and self.budget is not None:
+            self.budget = max(self.budget - (time.time() - startTime), 0)
+        return False
+
+    def close(self):
+        # close database connections
         self.database.close()
+        self.ratings.releaseRatings()
+        if self.cache is not None:
+            self.cache.close()
+        self.progress.close()
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
 
     def populateDb(self):
         self.cursor.execute('''CREATE TABLE modules
@@ -54,22 +289,6 @@ class priorityHandler():
                         duration INTEGER,
                         userPriority INTEGER,
                         priority INTEGER)''')
-        self.cursor.execute('''CREATE TABLE combinations
-                       (id INTEGER PRIMARY KEY,
-                       combination TEXT,
-                       rating INTEGER)''')
-        self.cursor.execute('''CREATE TABLE priorityCombinations
-                       (id INTEGER PRIMARY KEY,
-                       combination TEXT,
-                       rating INTEGER)''')
-        self.cursor.execute('''CREATE TABLE schedule
-                       (id INTEGER PRIMARY KEY,
-                       weekday INTEGER,
-                       hourStart INTEGER,
-                       hourEnd INTEGER,
-                       minuteStart INTEGER,
-                       minuteEnd INTEGER,
-                       userPriority INTEGER)''')
 
     def populateTables(self, configuration):
         i = 0
@@ -99,133 +318,56 @@ class priorityHandler():
             i += 1
 
     def generateAllPossibleSessionCombinations(self):
-        print('Step 1/2: Generating all possible combinations of sessions')
-        # generate list only containing session ids for each module
-        sessionIds = []
-        for module in self.modules:
-            moduleContent = list(module.values())
-            thisSessions = []
-            thisSessionIds = moduleContent[0]['sessions']
-            for sessionId in thisSessionIds:
-                thisSessions.append(list(sessionId.keys()))
-            sessionIds.append(thisSessions)
-        allCombinations = itertools.product(*sessionIds)
-
-        # save combinations to database
-        self.savePossibleSessionCombinationsToDb(allCombinations)
-
-    def savePossibleSessionCombinationsToDb(self, combinations):
-        for combination in combinations:
-            combinationJson = json.dumps(combination)
-            self.cursor.execute('''INSERT INTO combinations (combination)
-                                VALUES(?)''', [combinationJson])
-
-    def rateSessionCombinations(self):
-        self.cursor.execute('SELECT * FROM combinations')
-        combinations = self.cursor.fetchall()
-        for combination in combinations:
-            # generate schedule for this combination
-            self.generateSchedule(json.loads(combination[1]))
-
-            # save rating
-            rating = self.rateSchedule()
-
-            self.emptySchedule()
-
-            self.cursor.execute('UPDATE combinations SET rating=? WHERE id=?',
-                                [rating, combination[0]])
-
-    def generateSchedule(self, combination):
-        i = 0
-        for session in combination:
-            sessionData = self.getSessionById(i, session[0])
-            weekday = sessionData['weekday']
-            hourStart = sessionData['hour']
-            minuteStart = sessionData['minute']
-            end = configHandler.configHandler().getEndTime(
-                {'hour': hourStart, 'minute': minuteStart,
-                 'duration': sessionData['duration']})
-            hourEnd = end['hour']
-            minuteEnd = end['minute']
-            userPriority = sessionData['userPriority']
-
-            # add session to temporary schedule
-            self.cursor.execute('''INSERT INTO schedule (weekday, hourStart,
-                                hourEnd, minuteStart, minuteEnd, userPriority)
-                                VALUES(?, ?, ?, ?, ?, ?)''',
-                                [weekday, hourStart, hourEnd, minuteStart,
-                                 minuteEnd, userPriority])
-
-            i += 1
-
-    def rateSchedule(self):
-        self.cursor.execute('SELECT * FROM schedule')
-        schedule = self.cursor.fetchall()
-
-        rating = 0  # value will be reduced when collissions are detected
-
-        # check each schedule entry for collisions with other events
-        for entry in schedule:
-            # calculate start time in minutes since midnight
-            startTime = 60 * int(entry[2]) + int(entry[4])
-            endTime = 60 * int(entry[3]) + int(entry[5])
-
-            # add user rating of session
-            rating += int(entry[6] / 10)
-
-            # compare item to all other items on same weekday and calculate
-            # rating
-            for toCompare in schedule:
-                if entry[0] == toCompare[0] or entry[1] != toCompare[1]:
-                    # do not compare entry with itself and only with sessions on
-                    # same weekday
-                    continue
-                startTimeCompare = 60 * int(toCompare[2]) + int(toCompare[4])
-                endTimeCompare = 60 * int(toCompare[3]) + int(toCompare[5])
-
-                # check for overlapping
-                rating -= self.calculateSessionSingleRating(
-                    [startTime, endTime], [startTimeCompare, endTimeCompare])
-
-        return rating
-
-    def calculateSessionSingleRating(self, time, timeCompare):
-        minDifference = self.settings['minDifference']
-        # merge minDifference into times of first event (not to second in order
-        # to not have higher impact (otherwise would count multiple times)
-        time[0] -= minDifference
-        time[1] += minDifference
-
-        singleRating = 0
-
-        # first case: first entry overlaps second on both sides
-        if time[0] < timeCompare[0] and time[1] > timeCompare[1]:
-            # return left and right overhead
-            singleRating = (abs(abs((timeCompare[1] - time[0])) +
-                            abs((time[1] - timeCompare[0]))))
-        # second case: second entry overlaps first entry on both sides
-        elif timeCompare[0] < time[0] and timeCompare[1] > time[1]:
-            # return left and right overhead
-            singleRating = (abs(abs((timeCompare[1] - time[0])) +
-                            abs((time[1] - timeCompare[0]))))
-        # third case: first entry overlaps second only on the right side
-        elif timeCompare[0] < time[1] and timeCompare[1] > time[0]:
-            # return right overhead of second entry
-            singleRating = abs(timeCompare[1] - time[0])
-        # fourth case: first entry overlaps second only on the left side
-        elif timeCompare[0] < time[1] and timeCompare[1] > time[0]:
-            # return left overhead of second entry
-            singleRating = abs(time[1] - timeCompare[0])
-
-        if singleRating > minDifference:
-            # let real collisions have more impact than collisions which only
-            # affect the time frame between events (events overlapping on both
-            # sides will have more impact if they are exceeding the limit on
-            # total (i.e. on both sides for minDifference / 2 or on one side
-            # completely and on the other side not)
-            singleRating = singleRating * 2
-
-        return singleRating
+        self.log('Step 1/2: Generating all possible combinations of sessions')
+        if self.resume is not None:
+            # the ratings are part of the checkpoint
+            self.ratings.combinationRatings.frombytes(self.resume['ratings'])
+            return
+        if (self.ratingTable is not None and
+                self.ratings.loadRatingTable(self.ratingTable)):
+            # the ratings are mapped from the rating table of an earlier run
+            return
+
+        self.rateAllSessionCombinations()
+
+        if self.ratingTable is not None:
+            self.ratings.saveRatingTable(self.ratingTable)
+
+    def rateAllSessionCombinations(self):
+        if self.catalogue is not None:
+            # only the user ratings are added to the shared collisions
+            self.ratings.combinationRatings = self.catalogue.getRatings(
+                self.ratings)
+            return
+        if (self.cache is not None and
+                self.ratings.loadCachedRatings(self.cache)):
+            # the ratings of all combinations are known already
+            return
+
+        # the session indexes of every module are known by the rating handler
+        allCombinations = itertools.product(*self.ratings.moduleSessions)
+
+        # rate the combinations while they are generated
+        self.rateSessionCombinations(allCombinations)
+
+        if self.cache is not None:
+            self.ratings.saveCachedRatings(self.cache)
+
+    def rateSessionCombinations(self, combinations):
+        # the combinations are generated in the order of the combination
+        # index; only one block of them is held in memory at once
+        ratings = self.ratings.combinationRatings
+        self.progress.start('sessionCombinations',
+                            self.ratings.combinationCount)
+        while True:
+            block = list(itertools.islice(combinations,
+                                          self.ratings.blockSize))
+            if not block:
+                break
+
+            ratings.extend(self.ratings.rateBlock(block))
+            self.progress.update(len(ratings))
+        self.progress.finish(len(ratings))
 
     def getSessionById(self, moduleId, sessionId):
         sessions = list(self.modules[moduleId].values())[0]['sessions']
@@ -235,24 +377,42 @@ class priorityHandler():
             if currentId == sessionId:
                 return list(session.values())[0]
 
-    def emptySchedule(self):
-        self.cursor.execute('DELETE FROM schedule')
-
     def savePriorityForSession(self, sessionId, priority):
         self.cursor.execute('UPDATE sessions SET priority=? WHERE sessionId=?',
                             [priority, sessionId[0]])
 
     def printAllPriotyCombinations(self):
-        self.cursor.execute('''SELECT combination FROM priorityCombinations
-                            ORDER BY rating ASC''')
-        combinations = self.cursor.fetchall()
+        results = self.results.getResults()
 
-        if len(combinations) > 1:
+        if self.results.top == 1 and len(results) > 1:
             print('There are multiple combinations with the same rating.')
 
-        for combination in combinations:
-            self.savePriorityCombinationsToSessions(json.loads(combination[0]))
-            self.printPriorities()
+        for rating, combination in results:
+            self.savePriorityCombinationsToSessions(combination)
+            if self.results.top == 1:
+                self.printPriorities()
+            else:
+                self.printPriorities(rating)
+
+    def getResults(self):
+        # the best priority combinations as a list (best first) in the format
+        # of configHandler.getResultSessions
+        return configHandler.configHandler().getResultSessions(
+            self.configuration, self.getResultPositions())
+
+    def getResultPositions(self):
+        # the best priority combinations as a list of (rating, priority
+        # lists) where every priority list contains the positions of the
+        # sessions within their module of the configuration
+        positions = {}
+        for moduleId, module in enumerate(self.modules):
+            for position, session in enumerate(module[moduleId]['sessions']):
+                positions[list(session.keys())[0]] = position
+
+        return [(rating, [[positions[sessionId[0]]
+                           for sessionId in permutation]
+                          for permutation in combination])
+                for rating, combination in self.results.getResults()]
 
     def savePriorityCombinationsToSessions(self, combination):
         # unset all session priorities
@@ -265,9 +425,11 @@ class priorityHandler():
                 self.savePriorityForSession(session, priority)
                 priority += 1
 
-    def printPriorities(self):
+    def printPriorities(self, rating=None):
         print('')
         print('The following priorities have been calculated:')
+        if rating is not None:
+            print('Rating: {:f}'.format(rating))
         print('')
 
         moduleId = 0
@@ -298,120 +460,299 @@ class priorityHandler():
         return self.getModuleById(id)[0]
 
     def generateAllPossiblePriorityCombinations(self):
-        print('Step 2/2: Rating all possible priority combinations')
+        self.log('Step 2/2: Rating all possible priority combinations')
+
+        if self.trialTime is not None and self.tryBranchAndBound():
+            return
+
+        if self.strategy == 'local-search':
+            self.ratePriorityCombinationsLocalSearch()
+            return
+
+        if self.pruneDominated:
+            self.logDominatedSessions()
 
         allCombinations = []
+        self.permutationCounts = []
         totalCombinations = 1
         for module in self.modules:
             moduleId = list(module.keys())[0]
-            self.totalCombinationsInCurrentStep = 1
-            allCombinations.append(
-                self.generatePriorityCombinationsForOneModule(moduleId))
-            totalCombinations *= self.totalCombinationsInCurrentStep
-        priorityCombinations = itertools.product(*allCombinations)
-
-        self.ratePriorityCombinations(priorityCombinations, totalCombinations)
-
-    def ratePriorityCombinations(self, priorityCombinations, totalCombinations):
-        totalCount = 0
-        startTime = time.time()
-        for priorityCombination in priorityCombinations:
-            rating = 0
-            combinations = itertools.product(
-                *priorityCombination)
-
-            i = 1
-            for combination in combinations:
-                likeliness = self.calculateLikeliness(len(self.modules), i)
-                rating += likeliness * self.getCombinationRating(combination)
-                if likeliness < 0.05:
-                    break  # significantly decreases the runtime for big data
-                    # sets (however the results have little less quality
-                i += 1
-
-            totalCount += 1
-            # do not calculate progress every iteration
-            percentage = (totalCount / totalCombinations) * 100
-
-            currentTime = time.time()
-            deltaTime = currentTime - startTime
-            if (percentage / 100) > 0:
-                estimatedTotalTime = deltaTime / (percentage / 100)
-                estimatedRemaining = estimatedTotalTime - deltaTime
+            # the offsets of the priority lists are calculated only once
+            allCombinations.append(self.ratings.getPermutations(
+                moduleId, self.getSessionIdsOfModule(moduleId),
+                self.settings['priorities'], self.pruneDominated))
+            self.permutationCounts.append(len(allCombinations[-1]))
+            totalCombinations *= self.permutationCounts[-1]
+
+        allPriorityCombinations = self.getPriorityCombinationCount()
+        if totalCombinations < allPriorityCombinations:
+            self.log('Rating {:d} of {:d} priority combinations, the others '
+                     'contain dominated sessions or are equal to rated '
+                     'ones'.format(totalCombinations, allPriorityCombinations))
+
+        if self.strategy == 'branch-and-bound':
+            self.ratePriorityCombinationsBranchAndBound()
+            return
+        # continue after the last checkpoint
+        start = 0
+        if self.resume is not None:
+            start = self.resume['position']
+            for rating, priorityCombination in self.resume['results']:
+                self.savePriorityCombinationRating(priorityCombination, rating)
+
+        try:
+            if self.workers > 1:
+                self.ratePriorityCombinationsParallel(totalCombinations, start)
             else:
-                estimatedTotalTime = 0
-                estimatedRemaining = None
-
-            sys.stdout.write("\rIteration {:d} of {:d} ({:f}".format(
-                totalCount, totalCombinations, percentage) + "%)" +
-                " remaining time: " + self.parseTime(estimatedRemaining))
-
+                self.ratePriorityCombinations(
+                    iterateShard(allCombinations, start, totalCombinations),
+                    totalCombinations, start)
+        except KeyboardInterrupt:
+            if self.checkpoint is not None:
+                self.log('')
+                self.log('Interrupted, progress has been saved to ' +
+                         self.checkpoint.fileName)
+            raise
+
+        # the final checkpoint contains the complete result
+        self.saveCheckpoint(totalCombinations, totalCombinations)
+
+        self.expandResults()
+
+    def ratePriorityCombinations(self, priorityCombinations, totalCombinations,
+                                 start=0):
+        totalCount = start
+        # the progress and the checkpoints are only checked every few
+        # iterations in order to keep the loop fast
+        checkInterval = self.progress.checkInterval
+        self.progress.start('priorityCombinations', totalCombinations, start)
+        try:
+            for priorityCombination in priorityCombinations:
+                rating = self.ratings.ratePriorityCombination(
+                    [permutation[1] for permutation in priorityCombination])
+
+                self.savePriorityCombinationRating(
+                    tuple([permutation[0]
+                           for permutation in priorityCombination]),
+                    rating,
+                    math.prod([permutation[2]
+                               for permutation in priorityCombination]))
+
+                # only counted once saved, an interruption during the save
+                # rates the combination again after resuming
+                totalCount += 1
+
+                if totalCount % checkInterval == 0:
+                    self.progress.update(totalCount, self.results.bestRating)
+                    if (self.checkpoint is not None and
+                            self.checkpoint.isDue()):
+                        self.saveCheckpoint(totalCount, totalCombinations)
+        except KeyboardInterrupt:
+            # all priority combinations before totalCount have been saved
+            self.saveCheckpoint(totalCount, totalCombinations)
+            raise
+        self.progress.finish(totalCount, self.results.bestRating)
+
+    def ratePriorityCombinationsParallel(self, totalCombinations, start=0):
+        shards = self.getShards(start, totalCombinations)
+        sessionIds = [self.getSessionIdsOfModule(list(module.keys())[0])
+                      for module in self.modules]
+
+        # all workers share the ratings of the session combinations, i.e. the
+        # memory does not grow with the number of workers; the rating
+        # handler is passed without them (a mapped rating table is mapped by
+        # the workers as well)
+        sharedRatings = self.ratings.shareRatings()
+        ratings = copy.copy(self.ratings)
+        ratings.combinationRatings = None
+        ratings.sharedMemory = None
+        ratings.ratingTable = None
+
+        pool = multiprocessing.Pool(
+            self.workers, initializer=initializeWorker,
+            initargs=(ratings, sharedRatings, sessionIds,
+                      self.settings['priorities'], self.results.top,
+                      self.pruneDominated))
+        self.progress.start('priorityCombinations', totalCombinations, start)
+        totalCount = 0
+        try:
+            # the results are merged in the order of the shards; this keeps
+            # the order of equally rated combinations of the serial path
+            for results in pool.imap(rateShard, shards):
+                for rating, count, priorityCombination in results:
+                    self.savePriorityCombinationRating(priorityCombination,
+                                                       rating, count)
+
+                totalCount += 1
+                # the progress is counted in priority combinations
+                self.progress.update(shards[totalCount - 1][1],
+                                     self.results.bestRating)
+
+                if self.checkpoint is not None and self.checkpoint.isDue():
+                    self.saveCheckpoint(shards[totalCount - 1][1],
+                                        totalCombinations)
+        except KeyboardInterrupt:
+            # all shards before totalCount have been saved
+            if totalCount > 0:
+                self.saveCheckpoint(shards[totalCount - 1][1],
+                                    totalCombinations)
+            raise
+        finally:
+            pool.terminate()
+        self.progress.finish(totalCombinations, self.results.bestRating)
+
+    def ratePriorityCombinationsBranchAndBound(self, budget=None):
+        # returns False if the search did not finish within the budget (in
+        # seconds); nothing is saved then
+        sessionIds = [self.getSessionIdsOfModule(list(module.keys())[0])
+                      for module in self.modules]
+        search = searchHandler.searchHandler(self.ratings, sessionIds,
+                                             self.settings['priorities'],
+                                             self.pruneDominated)
+
+        results = search.branchAndBound(self.results.top, self.progress,
+                                         limit=self.tieLimit, budget=budget)
+        self.log('Searched {:d} nodes, pruned {:d}'.format(
+            search.nodes, search.prunedNodes))
+        if results is None:
+            return False
+        self.logTruncated(search.truncated)
+        for rating, priorityCombination in results:
+            self.savePriorityCombinationRating(priorityCombination, rating)
+        return True
+
+    def ratePriorityCombinationsLocalSearch(self):
+        sessionIds = [self.getSessionIdsOfModule(list(module.keys())[0])
+                      for module in self.modules]
+        search = localSearchHandler.localSearchHandler(
+            self.ratings, sessionIds, self.settings['priorities'], self.seed)
+
+        results = search.search(self.results.top, self.iterations,
+                                self.budget, self.progress)
+        self.log('Tried {:d} moves, accepted {:d}'.format(
+            search.moves, search.acceptedMoves))
+        for rating, priorityCombination in results:
             self.savePriorityCombinationRating(priorityCombination, rating)
 
-    def parseTime(self, seconds):
-        if seconds is None:
-            return "unavailable"
-        hours = math.floor(seconds / 3600)
-        minutes = math.floor((seconds % 3600) / 60)
-        seconds = seconds % 60
-        return "{:2d}:{:2d}:{:2d}".format(hours, minutes, int(seconds))
-
-    def calculateLikeliness(self, moduleCount, iteration):
-        # the sum of all binomial coefficients is 2^n. We do not consider nC0,
-        # therefore we use 2^n - 1. In total, the possibilities per step can be
-        # calculated by (2^n - 2) * (h - 1) + 1 where n is the number of
-        # considered priorities and h the highest priority occuring (-2 because
-        # we do not want to consider a combination only consisting of h multiple
-        # times, therefore we reduce the number of possibilities per iteration
-        # and add them to the total result)
-        # that formula results in h = ((i - 1)/(2^2 - 2)) + 1 (where i is the
-        # current iteration
-        # the calculation is not absolutely exact, as it is possible to have
-        # modules with less than maxPriority sessions; however it should be
-        # accurate enough given the general limitations of this algorithm
-        highestPriority = ((iteration - 1) / (math.pow(2, 2) - 2)) + 1
-
-        # likeliness is 1 / h, i.e. 1 for the combination of all first
-        # priorities, 1 / 2 when at least one priority 2 is used, 1/10 when one
-        # priority 10 is used etc
-        return 1 / highestPriority
-
-    def savePriorityCombinationRating(self, combination, rating):
-        # check if there is already a priority combination with better rating -
-        # then we can truncate this combination immediately
-        self.cursor.execute('SELECT * FROM priorityCombinations WHERE rating>?',
-                            [rating])
-        if len(self.cursor.fetchall()) == 0:
-            self.cursor.execute('''INSERT INTO priorityCombinations
-                                (combination, rating)
-                                VALUES (?, ?)''', [json.dumps(combination),
-                                                   rating])
-            # delete all combinations with worse rating
-            self.cursor.execute('''DELETE FROM priorityCombinations
-                                WHERE rating<?''', [rating])
-
-    def getCombinationRating(self, combination):
-        self.cursor.execute(
-            'SELECT rating FROM combinations WHERE combination=?',
-            [json.dumps(combination)])
-        return self.cursor.fetchone()[0]
-
-    def generatePriorityCombinationsForOneModule(self, moduleId):
-        sessions = self.getSessionIdsOfModule(moduleId)
-        priorities = self.settings['priorities']
-        if priorities > len(sessions):
-            priorities = len(sessions)
-
-        self.getPermutationCount(
-            len(sessions), priorities)
-        return itertools.permutations(sessions, r=priorities)
-
-    def getPermutationCount(self, n, k):
-        lastFactor = n - k + 1
-        permutations = 1
-        for factor in reversed(range(lastFactor, n + 1)):
-            permutations *= factor
-        self.totalCombinationsInCurrentStep = permutations
+        # compare with the best rating if it can be calculated; only the
+        # rating is needed, i.e. the ties are not expanded
+        if self.getPriorityCombinationCount() <= self.exactLimit:
+            exact = searchHandler.searchHandler(
+                self.ratings, sessionIds, self.settings['priorities'],
+                True).branchAndBound(expand=False)
+            self.gap = exact[0][0] - results[0][0]
+            self.log('Gap to the best rating ({:f}): {:f}'.format(
+                exact[0][0], self.gap))
+
+    def getShards(self, start, totalCombinations):
+        # split the flat index range of the priority combination product
+        # (whose size is the product of the permutation counts of all
+        # modules) into contiguous shards
+        if start >= totalCombinations:
+            return []
+        shardCount = min(totalCombinations - start,
+                         self.workers * self.shardsPerWorker)
+        boundaries = [start + (totalCombinations - start) * i // shardCount
+                      for i in range(shardCount + 1)]
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def saveCheckpoint(self, position, totalCombinations):
+        if self.checkpoint is None:
+            return
+        self.checkpoint.saveCheckpoint(
+            self.configuration, self.results.top, position, totalCombinations,
+            self.results.getResults(), self.ratings.combinationRatings)
+
+    def getPriorityCombinationCount(self):
+        # number of all priority combinations
+        count = 1
+        for module in self.modules:
+            sessionCount = len(list(module.values())[0]['sessions'])
+            count *= math.perm(sessionCount,
+                               min(self.settings['priorities'], sessionCount))
+        return count
+
+    def savePriorityCombinationRating(self, combination, rating, count=1):
+        self.results.saveResult(rating, combination, count)
+
+    def expandResults(self):
+        # every rated priority combination stands for all priority
+        # combinations with the same session indexes; they are generated in
+        # the order of the priority combinations and merged, only the first
+        # tieLimit of them are kept
+        groups = [self.getEqualSessions(list(module.keys())[0])
+                  for module in self.modules]
+        combinations = list(itertools.islice(heapq.merge(*[
+            self.getEqualCombinations(groups, rating, priorityCombination)
+            for rating, priorityCombination in self.results.getResults()]),
+            self.tieLimit + 1))
+        self.logTruncated(len(combinations) > self.tieLimit)
+
+        self.results = resultHandler.resultHandler(self.results.top)
+        for rating, combination in combinations[:self.tieLimit]:
+            self.savePriorityCombinationRating(combination, -rating)
+
+    def getEqualCombinations(self, groups, rating, priorityCombination):
+        # all priority combinations with the same session indexes as
+        # (-rating, combination) in the order of the priority combinations
+        for combination in itertools.product(*[
+                sorted(self.getEqualPermutations(moduleGroups, permutation))
+                for moduleGroups, permutation in zip(
+                    groups, priorityCombination)]):
+            yield (-rating, combination)
+
+    def logTruncated(self, truncated):
+        self.truncated = truncated
+        if truncated:
+            self.log('Only the first {:d} equally rated priority combinations '
+                     'are kept.'.format(self.tieLimit))
+
+    def getEqualSessions(self, moduleId):
+        # the session ids of a module grouped by their session index
+        groups = {}
+        for sessionId in self.getSessionIdsOfModule(moduleId):
+            groups.setdefault(self.ratings.sessionIndex[sessionId[0]],
+                              []).append(sessionId)
+        return groups
+
+    def getEqualPermutations(self, groups, permutation):
+        # all priority lists of a module with the same session indexes: the
+        # sessions of every index are permuted among the priorities of that
+        # index only
+        positions = {}
+        for position, entry in enumerate(self.ratings.getIndexes(permutation)):
+            positions.setdefault(entry, []).append(position)
+
+        equalPermutations = []
+        for choice in itertools.product(*[
+                itertools.permutations(groups[entry], len(entryPositions))
+                for entry, entryPositions in positions.items()]):
+            equalPermutation = list(permutation)
+            for entryPositions, sessions in zip(positions.values(), choice):
+                for position, session in zip(entryPositions, sessions):
+                    equalPermutation[position] = session
+            equalPermutations.append(tuple(equalPermutation))
+        return equalPermutations
+
+    def logDominatedSessions(self):
+        if not self.verbose:
+            return
+
+        config = configHandler.configHandler()
+        for moduleId, sessions in enumerate(self.ratings.moduleSessions):
+            for entry in sessions:
+                if not self.ratings.dominators[entry]:
+                    continue
+                self.log('{}: {} is dominated by {} (lower preference and at '
+                         'least the same collisions); priority lists ranking '
+                         'it before them are skipped'.format(
+                             self.getModuleNameById(moduleId)['name'],
+                             config.printSingleSession(
+                                 self.ratings.sessions[entry]),
+                             ', '.join([config.printSingleSession(
+                                 self.ratings.sessions[dominator])
+                                 for dominator in
+                                 self.ratings.dominators[entry]])))
 
     def getSessionIdsOfModule(self, moduleId):
         self.cursor.execute('SELECT sessionId FROM sessions WHERE module=?',
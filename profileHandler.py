@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import priorityHandler
+import ratingHandler
+
+
+class profileHandler():
+    # records the wall time, the number of calls and optionally the memory
+    # allocated by the stages of a calculation (see profiledHandler). Only
+    # the main process is profiled; use a single worker when profiling
+
+    def __init__(self, memory=False, dumpFile=None, samplesFile=None,
+                 sampleInterval=0.005):
+        # memory traces the allocations (slow), dumpFile receives the
+        # cProfile statistics (see pstats) and samplesFile the sampled call
+        # stacks in the collapsed format of flame graphs
+        self.memory = memory
+        self.dumpFile = dumpFile
+        self.samplesFile = samplesFile
+        self.sampleInterval = sampleInterval
+
+        # name: [calls, seconds, allocated bytes, peak bytes]
+        self.stages = {}
+        # traced memory at the start of the running stages
+        self.peaks = []
+        self.profiler = None
+        self.sampler = None
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start()
+        if self.dumpFile is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if self.samplesFile is not None:
+            self.samples = {}
+            self.running = True
+            self.sampler = threading.Thread(
+                target=self.sample, args=(threading.get_ident(),),
+                daemon=True)
+            self.sampler.start()
+
+    def stop(self):
+        if self.sampler is not None:
+            self.running = False
+            self.sampler.join()
+            self.sampler = None
+            self.saveSamples()
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.dumpFile)
+            self.profiler = None
+        if self.memory:
+            tracemalloc.stop()
+
+    def call(self, name, function, *arguments):
+        # calls function and adds the call to the stage name
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak of a running stage is kept while the peak of this call
+            # is measured
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self.peaks.append(current)
+        start = time.perf_counter()
+        try:
+            return function(*arguments)
+        finally:
+            elapsed = time.perf_counter() - start
+            stage = self.stages.setdefault(name, [0, 0, 0, 0])
+            stage[0] += 1
+            stage[1] += elapsed
+            if self.memory:
+                end, peak = tracemalloc.get_traced_memory()
+                peak = max(self.peaks.pop(), peak)
+                if self.peaks:
+                    self.peaks[-1] = max(self.peaks[-1], peak)
+                stage[2] += end - current
+                stage[3] = max(stage[3], peak - current)
+
+    def getReport(self):
+        # lines describing all stages in the order in which they started
+        lines = ['{:<40}{:>9}{:>10}'.format('Stage', 'calls', 'seconds')]
+        if self.memory:
+            lines[0] += '{:>11}{:>11}'.format('allocated', 'peak')
+        for name, (calls, seconds, allocated, peak) in self.stages.items():
+            line = '{:<40}{:>9d}{:>10.3f}'.format(name, calls, seconds)
+            if self.memory:
+                line += '{:>11}{:>11}'.format(self.formatSize(allocated),
+                                              self.formatSize(peak))
+            lines.append(line)
+        return lines
+
+    def formatSize(self, size):
+        return '{:.1f} kB'.format(size / 1024)
+
+    def sample(self, threadId):
+        # counts the call stacks of the profiled thread at regular intervals
+        while self.running:
+            frame = sys._current_frames().get(threadId)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}'.format(
+                    os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+            time.sleep(self.sampleInterval)
+
+    def saveSamples(self):
+        # one line per call stack: the functions from the outermost one,
+        # separated by semicolons, and the number of samples
+        samples = open(self.samplesFile, 'w')
+        for stack, count in sorted(self.samples.items()):
+            samples.write('{} {:d}\n'.format(stack, count))
+        samples.close()
+
+
+class profiledRatings(ratingHandler.ratingHandler):
+    # rating handler adding its calls to a profileHandler
+
+    def __init__(self, profile, settings, modules, cache=None):
+        self.profile = profile
+        super().__init__(settings, modules, cache)
+
+    def __getstate__(self):
+        # worker processes do not profile
+        state = dict(self.__dict__)
+        state['profile'] = None
+        return state
+
+    def rateBlock(self, combinations):
+        if self.profile is None:
+            return super().rateBlock(combinations)
+        return self.profile.call('ratingHandler.rateBlock', super().rateBlock,
+                                 combinations)
+
+    def ratePriorityCombination(self, offsets):
+        if self.profile is None:
+            return super().ratePriorityCombination(offsets)
+        return self.profile.call('ratingHandler.ratePriorityCombination',
+                                 super().ratePriorityCombination, offsets)
+
+
+class profiledHandler(priorityHandler.priorityHandler):
+    # priority handler adding its stages to a profileHandler; it is only used
+    # when profiling, i.e. the profiling costs nothing otherwise
+
+    def __init__(self, configuration, profile, **options):
+        self.profile = profile
+        super().__init__(configuration, **options)
+
+    def populateTables(self, configuration):
+        return self.profile.call('populateTables', super().populateTables,
+                                 configuration)
+
+    def createRatings(self):
+        # precalculation of the sessions and the penalties of all pairs
+        return self.profile.call('ratingHandler', profiledRatings,
+                                 self.profile, self.settings, self.modules,
+                                 self.cache)
+
+    def estimate(self):
+        return self.profile.call('estimate', super().estimate)
+
+    def generateAllPossibleSessionCombinations(self):
+        return self.profile.call(
+            'generateAllPossibleSessionCombinations',
+            super().generateAllPossibleSessionCombinations)
+
+    def rateSessionCombinations(self, combinations):
+        return self.profile.call('rateSessionCombinations',
+                                 super().rateSessionCombinations, combinations)
+
+    def generateAllPossiblePriorityCombinations(self):
+        return self.profile.call(
+            'generateAllPossiblePriorityCombinations',
+            super().generateAllPossiblePriorityCombinations)
+
+    def savePriorityCombinationRating(self, combination, rating, count=1):
+        return self.profile.call('savePriorityCombinationRating',
+                                 super().savePriorityCombinationRating,
+                                 combination, rating, count)
+
+    def getResults(self):
+        return self.profile.call('getResults', super().getResults)
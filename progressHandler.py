@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import json
+import math
+import sys
+import time
+
+
+class progressHandler():
+    # minimum number of seconds between two reports
+    interval = 0.5
+    # number of iterations after which the callers update the progress; the
+    # time is only checked then
+    checkInterval = 1000
+
+    def __init__(self, reporters=None):
+        # a reporter is any object with report(metrics), finish() (called at
+        # the end of every stage) and close(); metrics is a dictionary (see
+        # getMetrics)
+        self.reporters = reporters or []
+        self.stage = None
+
+    def start(self, stage, total=None, startCount=0):
+        # total is None if the number of iterations is unknown; startCount is
+        # the number of iterations done before (e.g. by a resumed
+        # calculation)
+        self.stage = stage
+        self.total = total
+        self.startCount = startCount
+        self.startTime = time.time()
+        self.lastReport = self.startTime
+
+    def update(self, count, bestRating=None, prunedRatio=None, force=False):
+        if not self.reporters:
+            return
+
+        currentTime = time.time()
+        if not force and currentTime - self.lastReport < self.interval:
+            return
+        self.lastReport = currentTime
+
+        metrics = self.getMetrics(count, currentTime, bestRating, prunedRatio)
+        for reporter in self.reporters:
+            reporter.report(metrics)
+
+    def finish(self, count, bestRating=None, prunedRatio=None):
+        # the last state of a stage is always reported
+        self.update(count, bestRating, prunedRatio, True)
+        for reporter in self.reporters:
+            reporter.finish()
+
+    def getMetrics(self, count, currentTime, bestRating, prunedRatio):
+        elapsed = currentTime - self.startTime
+        done = count - self.startCount
+
+        remaining = None
+        if self.total is not None and done > 0:
+            # only the iterations since startCount have been done in this run
+            remaining = (elapsed / done) * (self.total - count)
+
+        return {'stage': self.stage,
+                'count': count,
+                'total': self.total,
+                'elapsed': elapsed,
+                'iterationsPerSecond': done / elapsed if elapsed > 0 else None,
+                'remaining': remaining,
+                'bestRating': bestRating,
+                'prunedRatio': prunedRatio}
+
+    def close(self):
+        for reporter in self.reporters:
+            reporter.close()
+
+
+class terminalReporter():
+    labels = {'sessionCombinations': 'Session combination',
+              'priorityCombinations': 'Iteration',
+              'branchAndBound': 'Node',
+              'localSearch': 'Move'}
+
+    def __init__(self):
+        # whether the current line contains progress
+        self.active = False
+
+    def report(self, metrics):
+        label = self.labels.get(metrics['stage'], metrics['stage'])
+        if metrics['total'] is None:
+            line = '\r{} {:d}'.format(label, metrics['count'])
+        else:
+            line = '\r{} {:d} of {:d} ({:f}%)'.format(
+                label, metrics['count'], metrics['total'],
+                (metrics['count'] / max(metrics['total'], 1)) * 100)
+        if metrics['prunedRatio'] is not None:
+            line += ' pruned: {:.1f}%'.format(metrics['prunedRatio'] * 100)
+        if metrics['bestRating'] is not None:
+            line += ' best rating: {:f}'.format(metrics['bestRating'])
+        if metrics['total'] is not None:
+            line += ' remaining time: ' + self.parseTime(metrics['remaining'])
+
+        sys.stdout.write(line)
+        sys.stdout.flush()
+        self.active = True
+
+    def finish(self):
+        if self.active:
+            sys.stdout.write('\n')
+            self.active = False
+
+    def close(self):
+        pass
+
+    def parseTime(self, seconds):
+        if seconds is None:
+            return "unavailable"
+        hours = math.floor(seconds / 3600)
+        minutes = math.floor((seconds % 3600) / 60)
+        seconds = seconds % 60
+        return "{:2d}:{:2d}:{:2d}".format(hours, minutes, int(seconds))
+
+
+class metricsReporter():
+    # writes every report as a line of JSON, e.g. for monitoring long
+    # calculations
+
+    def __init__(self, fileName):
+        self.file = open(fileName, 'a')
+
+    def report(self, metrics):
+        metrics = dict(metrics, time=time.time())
+        self.file.write(json.dumps(metrics) + '\n')
+        self.file.flush()
+
+    def finish(self):
+        pass
+
+    def close(self):
+        self.file.close()
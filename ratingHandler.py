@@ -0,0 +1,517 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+from array import array
+from multiprocessing import shared_memory
+import hashlib
+import itertools
+import json
+import math
+import os.path
+import configHandler
+
+
+class ratingHandler():
+    # number of session combinations which are rated at once
+    blockSize = 10000
+
+    def __init__(self, settings, modules, cache=None):
+        self.settings = settings
+
+        # session data is kept in flat arrays; sessions of a module which are
+        # equal for the rating (same time and user rating) share an index,
+        # i.e. only the distinct sessions are combined and rated.
+        # sessionIndex contains the index of every session id
+        self.sessionIndex = {}
+        self.weekdays = array('i')
+        self.startTimes = array('i')
+        self.endTimes = array('i')
+        self.userRatings = array('i')
+        # first session of every index
+        self.sessions = []
+        # distinct session indexes of every module
+        self.moduleSessions = []
+
+        for module in modules:
+            sessions = list(module.values())[0]['sessions']
+            self.moduleSessions.append([])
+            indexes = {}
+            for session in sessions:
+                sessionId = list(session.keys())[0]
+                session = list(session.values())[0]
+                key = (session['weekday'], session['hour'], session['minute'],
+                       session['duration'], int(session['userPriority'] / 10))
+                if key not in indexes:
+                    indexes[key] = len(self.weekdays)
+                    self.moduleSessions[-1].append(len(self.weekdays))
+                    self.addSession(session)
+                self.sessionIndex[sessionId] = indexes[key]
+
+        self.calculateMasks()
+        self.calculatePenalties(cache)
+        self.calculateDominators()
+        self.calculateOffsets()
+        self.calculateWeights(modules)
+
+        # ratings of all session combinations, indexed by combination index
+        self.combinationRatings = array('i')
+        # ratings of a cached rating table which can be reused, and the offset
+        # of each session within that table
+        self.cachedRatings = None
+        self.cachedOffsets = None
+        # shared memory containing the ratings (see shareRatings)
+        self.sharedMemory = None
+        # rating table file whose mapping contains the ratings (see
+        # loadRatingTable)
+        self.ratingFile = None
+        self.ratingTable = None
+
+    def addSession(self, session):
+        end = configHandler.configHandler().getEndTime(session)
+
+        self.sessions.append(session)
+        self.weekdays.append(session['weekday'])
+        # times are saved in minutes since midnight
+        self.startTimes.append(60 * session['hour'] + session['minute'])
+        self.endTimes.append(60 * end['hour'] + end['minute'])
+        self.userRatings.append(int(session['userPriority'] / 10))
+
+    def calculateMasks(self):
+        # every session gets a bitmask of the time it occupies during the week
+        # and one of this time extended by minDifference on both sides. Two
+        # sessions have a penalty exactly if the extended mask of one of them
+        # intersects the mask of the other one, i.e. a single AND shows
+        # whether a session collides with any session of a combination.
+        # The bits stand for the intervals between all start and end times
+        # (with and without minDifference) instead of single minutes, which
+        # keeps the masks short
+        minDifference = self.settings['minDifference']
+        # the times of all days are made distinct by an offset per weekday
+        # which leaves room for minDifference
+        dayLength = 24 * 60 + 2 * minDifference
+        intervals = []
+        for weekday, start, end in zip(self.weekdays, self.startTimes,
+                                       self.endTimes):
+            start += weekday * dayLength + minDifference
+            end += weekday * dayLength + minDifference
+            intervals.append(((start, end),
+                              (start - minDifference, end + minDifference)))
+
+        boundaries = sorted(set(
+            [time for interval in intervals for bounds in interval
+             for time in bounds]))
+        bits = {time: position for position, time in enumerate(boundaries)}
+
+        self.occupancyMasks = []
+        self.paddedMasks = []
+        for occupied, padded in intervals:
+            if occupied[0] >= occupied[1]:
+                # sessions without duration are always compared exactly
+                self.occupancyMasks.append(-1)
+                self.paddedMasks.append(-1)
+                continue
+            self.occupancyMasks.append(self.getMask(bits, occupied))
+            self.paddedMasks.append(self.getMask(bits, padded))
+
+    def getMask(self, bits, interval):
+        # mask of all bits between the bits of the start and end of interval
+        return (1 << bits[interval[1]]) - (1 << bits[interval[0]])
+
+    def calculateOffsets(self):
+        # combinations are addressed by a mixed-radix index over the positions
+        # of their sessions within the modules; the last module changes
+        # fastest as in itertools.product. The offset of a session is its
+        # position multiplied with the weight (stride) of its module, i.e. the
+        # index of a combination is the sum of the offsets of its sessions
+        self.strides = []
+        offsets = [0] * len(self.weekdays)
+        self.combinationCount = 1
+        for sessions in reversed(self.moduleSessions):
+            self.strides.insert(0, self.combinationCount)
+            for position, entry in enumerate(sessions):
+                offsets[entry] = position * self.combinationCount
+            self.combinationCount *= len(sessions)
+
+        # offsets by session id
+        self.offsets = {sessionId: offsets[entry]
+                        for sessionId, entry in self.sessionIndex.items()}
+
+    def rateBlock(self, combinations):
+        # rates a block of session combinations (tuples of session indexes as
+        # generated by itertools.product)
+        ratings = array('i')
+        cachedOffsets = self.cachedOffsets
+        for combination in combinations:
+            if cachedOffsets is not None:
+                # reuse the cached rating if all sessions are in the cached
+                # rating table
+                index = 0
+                for entry in combination:
+                    if cachedOffsets[entry] is None:
+                        break
+                    index += cachedOffsets[entry]
+                else:
+                    ratings.append(self.cachedRatings[index])
+                    continue
+
+            ratings.append(self.rateCombination(combination))
+
+        return ratings
+
+    def loadCachedRatings(self, cache):
+        # returns True if the ratings of all session combinations have been
+        # loaded from the cache; otherwise the ratings of the cached rating
+        # table sharing the most session combinations are reused while rating
+        self.moduleHashes = [
+            [cache.getSessionHash(self.sessions[entry]) for entry in sessions]
+            for sessions in self.moduleSessions]
+        cached = cache.loadRatings(self.moduleHashes,
+                                   self.settings['minDifference'])
+        if cached is None:
+            return False
+
+        cachedModules, self.cachedRatings = cached
+        if cachedModules == self.moduleHashes:
+            self.combinationRatings = self.cachedRatings
+            self.cachedRatings = None
+            return True
+
+        self.cachedOffsets = [None] * len(self.weekdays)
+        stride = 1
+        for sessions, hashes, cachedHashes in reversed(list(zip(
+                self.moduleSessions, self.moduleHashes, cachedModules))):
+            for entry, sessionHash in zip(sessions, hashes):
+                if sessionHash in cachedHashes:
+                    self.cachedOffsets[entry] = (
+                        cachedHashes.index(sessionHash) * stride)
+            stride *= len(cachedHashes)
+
+        return False
+
+    def saveCachedRatings(self, cache):
+        cache.saveRatings(self.moduleHashes, self.settings['minDifference'],
+                          self.combinationRatings)
+        self.cachedRatings = None
+        self.cachedOffsets = None
+
+    def getTableKey(self):
+        # identifies the sessions of a rating table: the ratings only depend
+        # on the times and user ratings of the distinct sessions of every
+        # module and on minDifference
+        content = [self.settings['minDifference'],
+                   [[[self.weekdays[entry], self.startTimes[entry],
+                      self.endTimes[entry], self.userRatings[entry]]
+                     for entry in sessions]
+                    for sessions in self.moduleSessions]]
+        return hashlib.sha256(json.dumps(content).encode()).digest()
+
+    def loadRatingTable(self, fileName):
+        # maps the ratings of all session combinations from a rating table
+        # file (see configHandler.saveBinaryRatings) instead of rating them;
+        # returns False if the file does not exist or belongs to other
+        # sessions
+        if not os.path.isfile(fileName):
+            return False
+        config = configHandler.configHandler()
+        try:
+            table = config.openBinaryRatings(fileName)
+        except ValueError:
+            return False
+        if (table['key'] != self.getTableKey() or
+                table['moduleSizes'].tolist() !=
+                [len(sessions) for sessions in self.moduleSessions]):
+            config.closeBinaryRatings(table)
+            return False
+
+        self.ratingFile = fileName
+        self.ratingTable = table
+        self.combinationRatings = table['ratings']
+        return True
+
+    def saveRatingTable(self, fileName):
+        configHandler.configHandler().saveBinaryRatings(
+            fileName, self.getTableKey(),
+            [len(sessions) for sessions in self.moduleSessions],
+            self.combinationRatings)
+
+    def shareRatings(self):
+        # moves the ratings of all session combinations into shared memory
+        # which worker processes attach to without copying it (see
+        # attachRatings); returns its name, or None if the ratings are mapped
+        # from a rating table which the workers map as well. The ratings are
+        # read-only from now on
+        if self.ratingTable is not None:
+            return None
+        if self.sharedMemory is None:
+            ratings = self.combinationRatings
+            size = len(ratings) * ratings.itemsize
+            # shared memory cannot be empty
+            self.sharedMemory = shared_memory.SharedMemory(create=True,
+                                                           size=max(size, 1))
+            self.combinationRatings = self.sharedMemory.buf[:size].cast('i')
+            self.combinationRatings[:] = ratings
+        return self.sharedMemory.name
+
+    def attachRatings(self, name):
+        # uses the ratings shared by another process (see shareRatings)
+        if name is None:
+            if not self.loadRatingTable(self.ratingFile):
+                raise ValueError('The rating table has changed.')
+            return
+        self.sharedMemory = shared_memory.SharedMemory(name=name)
+        self.combinationRatings = self.sharedMemory.buf[
+            :self.combinationCount * array('i').itemsize].cast('i')
+
+    def releaseRatings(self):
+        # frees the shared memory of the process which shared the ratings
+        # and closes a mapped rating table; the ratings are not available
+        # afterwards
+        if self.ratingTable is not None:
+            self.combinationRatings = array('i')
+            configHandler.configHandler().closeBinaryRatings(self.ratingTable)
+            self.ratingTable = None
+        if self.sharedMemory is None:
+            return
+        self.combinationRatings.release()
+        self.combinationRatings = array('i')
+        self.sharedMemory.close()
+        self.sharedMemory.unlink()
+        self.sharedMemory = None
+
+    def calculatePenalties(self, cache=None):
+        # the penalty of two sessions only depends on their times and
+        # minDifference; therefore it is calculated once for every pair of
+        # sessions. Both directions of a pair are merged into a single value
+        # as each pair occurs in both orders when rating a combination
+        count = len(self.weekdays)
+        self.penalties = array('i', [0]) * (count * count)
+        minDifference = self.settings['minDifference']
+
+        if cache is not None:
+            cachedPenalties = cache.loadPenalties(minDifference)
+            timeHashes = [cache.getSessionHash(session, False)
+                          for session in self.sessions]
+            newPenalties = []
+
+        for entry in range(count):
+            for toCompare in range(count):
+                if (entry == toCompare or
+                        self.weekdays[entry] != self.weekdays[toCompare] or
+                        not self.paddedMasks[entry] &
+                        self.occupancyMasks[toCompare]):
+                    # do not compare session with itself and only with
+                    # sessions on same weekday which it collides with
+                    continue
+
+                if cache is not None:
+                    key = (timeHashes[entry], timeHashes[toCompare])
+                    if key in cachedPenalties:
+                        penalty = cachedPenalties[key]
+                    else:
+                        penalty = self.calculateSessionSingleRating(
+                            [self.startTimes[entry], self.endTimes[entry]],
+                            [self.startTimes[toCompare],
+                             self.endTimes[toCompare]])
+                        cachedPenalties[key] = penalty
+                        newPenalties.append(key + (penalty,))
+                else:
+                    penalty = self.calculateSessionSingleRating(
+                        [self.startTimes[entry], self.endTimes[entry]],
+                        [self.startTimes[toCompare], self.endTimes[toCompare]])
+                self.penalties[entry * count + toCompare] += penalty
+                self.penalties[toCompare * count + entry] += penalty
+
+        if cache is not None and newPenalties:
+            cache.savePenalties(newPenalties, minDifference)
+
+    def calculateDominators(self):
+        # a session is dominated by another session of its module if it has a
+        # lower user rating and collides at least as much with every session
+        # of the other modules; every session combination containing it is
+        # then rated lower than the same combination containing the other one
+        count = len(self.weekdays)
+        penalties = self.penalties
+        self.dominators = [[] for entry in range(count)]
+        for module, sessions in enumerate(self.moduleSessions):
+            others = [entry for otherSessions in
+                      self.moduleSessions[:module] +
+                      self.moduleSessions[module + 1:]
+                      for entry in otherSessions]
+            for entry in sessions:
+                for dominator in sessions:
+                    if (self.userRatings[dominator] >
+                            self.userRatings[entry] and
+                            all([penalties[entry * count + toCompare] >=
+                                 penalties[dominator * count + toCompare]
+                                 for toCompare in others])):
+                        self.dominators[entry].append(dominator)
+
+    def isDominated(self, module, permutation):
+        # whether a priority affecting the rating is given to a session which
+        # is dominated by a session without an earlier priority; giving that
+        # priority to the dominating session would increase the rating, i.e.
+        # the priority list cannot be part of the best priority combination
+        earlier = set()
+        for session in permutation[:self.usedPriorities[module]]:
+            entry = self.sessionIndex[session[0]]
+            for dominator in self.dominators[entry]:
+                if dominator not in earlier:
+                    return True
+            earlier.add(entry)
+        return False
+
+    def rateCombination(self, indexes):
+        count = len(self.weekdays)
+        penalties = self.penalties
+        paddedMasks = self.paddedMasks
+        occupancyMasks = self.occupancyMasks
+
+        rating = 0  # value will be reduced when collissions are detected
+        # time occupied by the previous sessions
+        occupied = 0
+
+        for position, entry in enumerate(indexes):
+            # add user rating of session
+            rating += self.userRatings[entry]
+
+            # subtract penalties of collisions with all previous sessions;
+            # they are only looked up if the session collides with any of them
+            if paddedMasks[entry] & occupied:
+                row = entry * count
+                for toCompare in indexes[:position]:
+                    rating -= penalties[row + toCompare]
+            occupied |= occupancyMasks[entry]
+
+        return rating
+
+    def calculateWeights(self, modules):
+        # a priority combination is rated by the first combinations of its
+        # priorities (in the order of itertools.product) until the likeliness
+        # drops below the cutoff. The likeliness of these terms only depends
+        # on their positions within the priority lists; therefore the terms
+        # and their likeliness are calculated once
+        cutoff = self.settings.get('likelinessCutoff', 0.05)
+        priorities = [min(self.settings['priorities'],
+                          len(list(module.values())[0]['sessions']))
+                      for module in modules]
+
+        self.terms = []
+        self.weights = []
+        i = 1
+        for positions in itertools.product(
+                *[range(modulePriorities) for modulePriorities in priorities]):
+            likeliness = self.calculateLikeliness(len(modules), i)
+            self.terms.append(positions)
+            self.weights.append(likeliness)
+            if likeliness < cutoff:
+                break  # significantly decreases the runtime for big data
+                # sets (however the results have little less quality
+            i += 1
+
+        # only the first priorities of a module are used by the terms; the
+        # remaining ones do not affect the rating
+        self.usedPriorities = [
+            max([positions[module] for positions in self.terms]) + 1
+            if self.terms else 0 for module in range(len(modules))]
+
+    def getOffsets(self, permutation):
+        # offsets of the sessions of a priority list of a module
+        return tuple([self.offsets[session[0]] for session in permutation])
+
+    def getIndexes(self, permutation):
+        # priority lists with the same indexes are rated the same
+        return tuple([self.sessionIndex[session[0]]
+                      for session in permutation])
+
+    def getPermutations(self, module, sessions, priorities, pruneDominated,
+                        limit=None):
+        # all priority lists of a module together with the offsets of their
+        # sessions and the number of priority lists they stand for: priority
+        # lists with the same session indexes are rated the same, only the
+        # first one of them is rated. With pruneDominated, the priority lists
+        # which cannot be part of the best priority combination are left
+        # out; limit restricts the priority lists which are considered
+        permutations = {}
+        for permutation in itertools.islice(itertools.permutations(
+                sessions, r=min(priorities, len(sessions))), limit):
+            if pruneDominated and self.isDominated(module, permutation):
+                continue
+            indexes = self.getIndexes(permutation)
+            if indexes in permutations:
+                permutations[indexes][2] += 1
+            else:
+                permutations[indexes] = [permutation,
+                                         self.getOffsets(permutation), 1]
+
+        return [tuple(permutation) for permutation in permutations.values()]
+
+    def ratePriorityCombination(self, offsets):
+        # offsets contains the offsets of the priority list of each module
+        ratings = self.combinationRatings
+        rating = 0
+        for weight, positions in zip(self.weights, self.terms):
+            rating += weight * ratings[sum([
+                moduleOffsets[position]
+                for moduleOffsets, position in zip(offsets, positions)])]
+
+        return rating
+
+    def calculateLikeliness(self, moduleCount, iteration):
+        # the sum of all binomial coefficients is 2^n. We do not consider nC0,
+        # therefore we use 2^n - 1. In total, the possibilities per step can be
+        # calculated by (2^n - 2) * (h - 1) + 1 where n is the number of
+        # considered priorities and h the highest priority occuring (-2 because
+        # we do not want to consider a combination only consisting of h multiple
+        # times, therefore we reduce the number of possibilities per iteration
+        # and add them to the total result)
+        # that formula results in h = ((i - 1)/(2^2 - 2)) + 1 (where i is the
+        # current iteration
+        # the calculation is not absolutely exact, as it is possible to have
+        # modules with less than maxPriority sessions; however it should be
+        # accurate enough given the general limitations of this algorithm
+        highestPriority = ((iteration - 1) / (math.pow(2, 2) - 2)) + 1
+
+        # likeliness is 1 / h, i.e. 1 for the combination of all first
+        # priorities, 1 / 2 when at least one priority 2 is used, 1/10 when one
+        # priority 10 is used etc
+        return 1 / highestPriority
+
+    def calculateSessionSingleRating(self, time, timeCompare):
+        minDifference = self.settings['minDifference']
+        # merge minDifference into times of first event (not to second in order
+        # to not have higher impact (otherwise would count multiple times)
+        time[0] -= minDifference
+        time[1] += minDifference
+
+        singleRating = 0
+
+        # first case: first entry overlaps second on both sides
+        if time[0] < timeCompare[0] and time[1] > timeCompare[1]:
+            # return left and right overhead
+            singleRating = (abs(abs((timeCompare[1] - time[0])) +
+                            abs((time[1] - timeCompare[0]))))
+        # second case: second entry overlaps first entry on both sides
+        elif timeCompare[0] < time[0] and timeCompare[1] > time[1]:
+            # return left and right overhead
+            singleRating = (abs(abs((timeCompare[1] - time[0])) +
+                            abs((time[1] - timeCompare[0]))))
+        # third case: first entry overlaps second only on the right side
+        elif timeCompare[0] < time[1] and timeCompare[1] > time[0]:
+            # return right overhead of second entry
+            singleRating = abs(timeCompare[1] - time[0])
+        # fourth case: first entry overlaps second only on the left side
+        elif timeCompare[0] < time[1] and timeCompare[1] > time[0]:
+            # return left overhead of second entry
+            singleRating = abs(time[1] - timeCompare[0])
+
+        if singleRating > minDifference:
+            # let real collisions have more impact than collisions which only
+            # affect the time frame between events (events overlapping on both
+            # sides will have more impact if they are exceeding the limit on
+            # total (i.e. on both sides for minDifference / 2 or on one side
+            # completely and on the other side not)
+            singleRating = singleRating * 2
+
+        return singleRating
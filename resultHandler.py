@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import heapq
+
+
+class resultHandler():
+    def __init__(self, top=1):
+        # number of best combinations to keep; combinations with the same
+        # rating as the worst kept combination are always kept as well
+        self.top = top
+
+        # min-heap of (rating, sequence, count, combination); the sequence
+        # keeps the order in which equally rated combinations were saved
+        self.results = []
+        self.sequence = 0
+        # number of combinations kept in total and per rating
+        self.totalCount = 0
+        self.ratingCounts = {}
+        self.bestRating = None
+
+    def saveResult(self, rating, combination, count=1):
+        # count is the number of combinations represented by this result
+        # (all of them have the same rating)
+        threshold = self.getThreshold()
+        if threshold is not None and rating < threshold:
+            return
+
+        heapq.heappush(self.results,
+                       (rating, self.sequence, count, combination))
+        self.sequence += 1
+        if self.bestRating is None or rating > self.bestRating:
+            self.bestRating = rating
+        self.totalCount += count
+        self.ratingCounts[rating] = self.ratingCounts.get(rating, 0) + count
+
+        # drop the worst rated combinations as long as enough better ones
+        # remain
+        worstRating = self.results[0][0]
+        while self.totalCount - self.ratingCounts[worstRating] >= self.top:
+            while self.results and self.results[0][0] == worstRating:
+                heapq.heappop(self.results)
+            self.totalCount -= self.ratingCounts.pop(worstRating)
+            worstRating = self.results[0][0]
+
+    def getThreshold(self):
+        # rating which a combination needs to reach in order to be kept
+        if self.totalCount < self.top:
+            return None
+        return self.results[0][0]
+
+    def getResults(self, counts=False):
+        # all kept combinations with their ratings (and counts), best first
+        results = sorted(self.results,
+                         key=lambda result: (-result[0], result[1]))
+        if counts:
+            return [(rating, count, combination)
+                    for rating, sequence, count, combination in results]
+        return [(rating, combination) for rating, sequence, count, combination
+                in results]
@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import heapq
+import itertools
+import math
+import time
+import resultHandler
+
+
+class searchHandler():
+    # number of nodes after which the time limit is checked
+    checkInterval = 1000
+
+    def __init__(self, ratings, sessionIds, priorities,
+                 pruneDominated=False):
+        self.ratings = ratings
+        # session ids of every module in the order of getSessionIdsOfModule
+        self.sessionIds = sessionIds
+        self.priorities = [min(priorities, len(sessions))
+                           for sessions in sessionIds]
+        # skip dominated sessions (see ratingHandler.isDominated); this only
+        # keeps the best priority combinations
+        self.pruneDominated = pruneDominated
+
+        self.calculateTerms()
+        self.calculateDominators()
+
+    def calculateTerms(self):
+        # the terms rating a priority combination are the same for all
+        # priority combinations (see ratingHandler.calculateWeights)
+        self.terms = self.ratings.terms
+        self.weights = self.ratings.weights
+
+        # only the first priorities of a module are used by the terms
+        self.usedPriorities = self.ratings.usedPriorities
+
+        # the priorities are assigned in the order in which the terms need
+        # them, i.e. the terms with the highest weight are determined first
+        self.variables = []
+        for positions in self.terms:
+            for module, priority in enumerate(positions):
+                if (module, priority) not in self.variables:
+                    self.variables.append((module, priority))
+
+    def calculateDominators(self):
+        # for every session and every session index dominating it, the
+        # positions of the sessions with that index within the module
+        self.dominators = []
+        for sessionIds in self.sessionIds:
+            indexes = [self.ratings.sessionIndex[sessionId[0]]
+                       for sessionId in sessionIds]
+            self.dominators.append(
+                [[[position for position, other in enumerate(indexes)
+                   if other == dominator]
+                  for dominator in self.ratings.dominators[entry]]
+                 for entry in indexes])
+
+    def branchAndBound(self, top=1, progress=None, expand=True, limit=None,
+                       budget=None):
+        # builds the priority lists priority by priority and discards all
+        # partial priority combinations whose upper bound of the rating is
+        # lower than the rating of the worst kept combination; progress is an
+        # optional progressHandler. Without expand, only the ratings of the
+        # results are complete (the priorities not affecting the rating are
+        # left out); limit is the number of expanded combinations which are
+        # kept at most (see expandTies). With budget (in seconds), the search
+        # stops when it takes longer and returns None
+        self.results = resultHandler.resultHandler(top)
+        self.progress = progress
+        self.knownValues = {}
+        self.sessionValues = {}
+        self.nodes = 0
+        self.prunedNodes = 0
+        self.truncated = False
+        self.budget = budget
+        self.startTime = time.time()
+        self.stopped = False
+
+        self.assignment = [[None] * used for used in self.usedPriorities]
+
+        if progress is not None:
+            progress.start('branchAndBound')
+        self.searchNode(0)
+        if progress is not None:
+            progress.finish(self.nodes, self.results.bestRating,
+                            self.getPrunedRatio())
+
+        if self.stopped:
+            return None
+        if not expand:
+            return self.results.getResults()
+        return self.expandTies(limit)
+
+    def searchNode(self, variableIndex):
+        if self.stopped:
+            return
+        self.nodes += 1
+        if (self.budget is not None and
+                self.nodes % self.checkInterval == 0 and
+                time.time() - self.startTime >= self.budget):
+            self.stopped = True
+            return
+        if (self.progress is not None and
+                self.nodes % self.progress.checkInterval == 0):
+            self.progress.update(self.nodes, self.results.bestRating,
+                                 self.getPrunedRatio())
+
+        if variableIndex == len(self.variables):
+            self.saveLeaf()
+            return
+
+        module, priority = self.variables[variableIndex]
+        used = self.assignment[module]
+
+        children = []
+        for session in range(len(self.sessionIds[module])):
+            if session in used:
+                continue
+            if self.pruneDominated and any(
+                    [not set(dominators) & set(used[:priority])
+                     for dominators in self.dominators[module][session]]):
+                self.prunedNodes += 1
+                continue
+
+            used[priority] = session
+            children.append((self.getBound(), session))
+        used[priority] = None
+
+        # visit the most promising children first in order to find good
+        # ratings early
+        children.sort(key=lambda child: -child[0])
+        for number, (bound, session) in enumerate(children):
+            if self.canBePruned(bound):
+                # all further children have a lower bound as well
+                self.prunedNodes += len(children) - number
+                break
+
+            used[priority] = session
+            self.searchNode(variableIndex + 1)
+            used[priority] = None
+
+    def getPrunedRatio(self):
+        # share of the visited and discarded nodes which have been discarded
+        return self.prunedNodes / max(self.nodes + self.prunedNodes, 1)
+
+    def canBePruned(self, bound):
+        threshold = self.results.getThreshold()
+        if threshold is None:
+            return False
+        # the bound is summed up in a different order than the rating; the
+        # tolerance makes sure that rounding never discards an equal rating
+        return bound < threshold - 1e-9 * (1 + abs(threshold))
+
+    def getBound(self):
+        # upper bound of the rating of all priority combinations starting with
+        # the current assignment. Penalties are never negative, therefore the
+        # collisions between unknown sessions can be ignored; what remains is
+        # a value for each unknown priority and each session
+        assignment = self.assignment
+        bound = 0
+        gains = {}
+        for weight, positions in zip(self.weights, self.terms):
+            key = tuple([assignment[module][position]
+                         for module, position in enumerate(positions)])
+            bound += weight * self.getKnownValue(key)
+            if None not in key:
+                continue
+
+            for module, session in enumerate(key):
+                if session is not None:
+                    continue
+                values = self.getSessionValues(module, key)
+                variable = (module, positions[module])
+                if variable in gains:
+                    gain = gains[variable]
+                    for position, value in enumerate(values):
+                        gain[position] += weight * value
+                else:
+                    gains[variable] = [weight * value for value in values]
+
+        moduleGains = {}
+        for (module, priority), gain in gains.items():
+            moduleGains.setdefault(module, []).append(gain)
+
+        # the unknown priorities of a module need different sessions; the
+        # bound is the lower one of choosing the best session for every
+        # priority and choosing the best priority for the best sessions
+        for module, allGains in moduleGains.items():
+            free = [session for session in range(len(self.sessionIds[module]))
+                    if session not in assignment[module]]
+            priorityBound = 0
+            for gain in allGains:
+                priorityBound += max([gain[session] for session in free])
+            sessionGains = sorted([max([gain[session] for gain in allGains])
+                                   for session in free], reverse=True)
+            bound += min(priorityBound, sum(sessionGains[:len(allGains)]))
+
+        return bound
+
+    def getKnownValue(self, key):
+        # rating of the known sessions of a session combination, i.e. the
+        # exact rating if all sessions are known
+        if key in self.knownValues:
+            return self.knownValues[key]
+
+        ratings = self.ratings
+        if None not in key:
+            value = ratings.combinationRatings[
+                sum([ratings.offsets[self.sessionIds[module][session][0]]
+                     for module, session in enumerate(key)])]
+        else:
+            count = len(ratings.weekdays)
+            known = [ratings.sessionIndex[self.sessionIds[module][session][0]]
+                     for module, session in enumerate(key)
+                     if session is not None]
+            value = 0
+            for position, entry in enumerate(known):
+                value += ratings.userRatings[entry]
+                row = entry * count
+                for toCompare in known[:position]:
+                    value -= ratings.penalties[row + toCompare]
+
+        self.knownValues[key] = value
+        return value
+
+    def getSessionValues(self, module, key):
+        # user rating of each session of a module minus its penalties with
+        # the known sessions of a session combination
+        if (module, key) in self.sessionValues:
+            return self.sessionValues[(module, key)]
+
+        ratings = self.ratings
+        count = len(ratings.weekdays)
+        known = [ratings.sessionIndex[self.sessionIds[otherModule][session][0]]
+                 for otherModule, session in enumerate(key)
+                 if session is not None]
+        values = []
+        for sessionId in self.sessionIds[module]:
+            entry = ratings.sessionIndex[sessionId[0]]
+            row = entry * count
+            value = ratings.userRatings[entry]
+            for toCompare in known:
+                value -= ratings.penalties[row + toCompare]
+            values.append(value)
+
+        self.sessionValues[(module, key)] = values
+        return values
+
+    def saveLeaf(self):
+        # the rating is calculated exactly as for the exhaustive search in
+        # order to get identical ratings
+        rating = 0
+        for weight, positions in zip(self.weights, self.terms):
+            rating += weight * self.ratings.combinationRatings[
+                sum([self.ratings.offsets[
+                    self.sessionIds[module][self.assignment[module][position]]
+                    [0]] for module, position in enumerate(positions)])]
+
+        # every leaf stands for all priority combinations which only differ
+        # in the priorities not affecting the rating
+        self.results.saveResult(
+            rating, [list(priorities) for priorities in self.assignment],
+            self.getTieCount())
+
+    def getTieCount(self):
+        count = 1
+        for module, used in enumerate(self.usedPriorities):
+            remaining = len(self.sessionIds[module]) - used
+            count *= math.perm(remaining, self.priorities[module] - used)
+        return count
+
+    def expandTies(self, limit=None):
+        # every priority which is not used by the terms can be set to any of
+        # the remaining sessions without changing the rating. The
+        # combinations of every result are generated in the order of the
+        # exhaustive search and merged, i.e. with limit only the first ones
+        # are generated and kept; truncated is set if others are left out
+        combinations = heapq.merge(*[
+            self.getTies(rating, assignment)
+            for rating, assignment in self.results.getResults()])
+        if limit is not None:
+            combinations = list(itertools.islice(combinations, limit + 1))
+            self.truncated = len(combinations) > limit
+            combinations = combinations[:limit]
+
+        return [(-rating,
+                 tuple(tuple(self.sessionIds[module][session]
+                             for session in priorities)
+                       for module, priorities in enumerate(combination)))
+                for rating, combination in combinations]
+
+    def getTies(self, rating, assignment):
+        # all combinations of a result as (-rating, combination) in the order
+        # of the exhaustive search
+        tails = []
+        for module, priorities in enumerate(assignment):
+            remaining = [session
+                         for session in range(len(self.sessionIds[module]))
+                         if session not in priorities]
+            tails.append([tuple(priorities) + tail
+                          for tail in itertools.permutations(
+                              remaining, r=self.priorities[module] -
+                              len(priorities))])
+        for combination in itertools.product(*tails):
+            yield (-rating, combination)
@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# Copyright 2015 Pascal Wichmann
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import catalogueHandler
+import configHandler
+import priorityHandler
+import resultHandler
+
+
+def generateConfig(generator):
+    # small configuration in the format of configHandler.saveConfig which
+    # can still be enumerated completely; some sessions are listed twice and
+    # the preferences are coarse, so equal and dominated sessions occur
+    modules = []
+    for module in range(generator.randint(1, 3)):
+        sessions = []
+        for session in range(generator.randint(1, 4)):
+            if sessions and generator.random() < 0.2:
+                sessions.append(dict(generator.choice(sessions)))
+                continue
+            start = 8 * 60 + generator.randrange(0, 240, 15)
+            sessions.append({'weekday': generator.randrange(2),
+                             'hour': start // 60,
+                             'minute': start % 60,
+                             'duration': generator.choice([45, 90]),
+                             'userPriority': generator.randrange(0, 101, 25)})
+        modules.append({'name': 'Module ' + str(module + 1),
+                        'sessions': sessions})
+
+    return {'settings': {'minDifference': generator.choice([0, 15, 30]),
+                         'priorities': generator.randint(1, 3)},
+            'modules': modules}
+
+
+def rateReference(ratings, sessions):
+    # rating of a session combination as calculated by the first version of
+    # the program: every pair of sessions on the same weekday is compared in
+    # both orders, without precalculated penalties or masks
+    config = configHandler.configHandler()
+    times = []
+    for session in sessions:
+        end = config.getEndTime(session)
+        times.append((60 * session['hour'] + session['minute'],
+                      60 * end['hour'] + end['minute']))
+
+    rating = 0
+    for position, session in enumerate(sessions):
+        rating += int(session['userPriority'] / 10)
+        for comparePosition, toCompare in enumerate(sessions):
+            if (position == comparePosition or
+                    session['weekday'] != toCompare['weekday']):
+                continue
+            rating -= ratings.calculateSessionSingleRating(
+                list(times[position]), list(times[comparePosition]))
+    return rating
+
+
+def solveReference(configuration, top):
+    # rates every priority combination of every session (no pruning, no
+    # equal sessions) and returns the results in the format of
+    # priorityHandler.getResults
+    handler = priorityHandler.priorityHandler(configuration, verbose=False)
+    ratings = handler.ratings
+    handler.close()
+
+    modules = [module['sessions'] for module in configuration['modules']]
+    combinationRatings = {}
+    for combination in itertools.product(
+            *[range(len(sessions)) for sessions in modules]):
+        combinationRatings[combination] = rateReference(
+            ratings, [modules[module][position]
+                      for module, position in enumerate(combination)])
+
+    results = resultHandler.resultHandler(top)
+    for priorityCombination in itertools.product(*[
+            itertools.permutations(range(len(sessions)), r=min(
+                configuration['settings']['priorities'], len(sessions)))
+            for sessions in modules]):
+        rating = 0
+        for weight, positions in zip(ratings.weights, ratings.terms):
+            rating += weight * combinationRatings[tuple(
+                [priorities[position] for priorities, position
+                 in zip(priorityCombination, positions)])]
+        results.saveResult(rating, [list(priorities) for priorities
+                                    in priorityCombination])
+
+    return configHandler.configHandler().getResultSessions(
+        configuration, results.getResults())
+
+
+def getVariants(workers, cacheDirectory):
+    # every way of calculating the results which has to match the reference;
+    # the cache and the rating table are used twice in order to calculate
+    # once with the saved ratings
+    cache = os.path.join(cacheDirectory, 'cache.sqlite')
+    ratingTable = os.path.join(cacheDirectory, 'ratings.bin')
+    return [('exhaustive', {}),
+            ('branch-and-bound', {'strategy': 'branch-and-bound'}),
+            ('workers', {'workers': workers}),
+            ('cache', {'cache': cache}),
+            ('cached', {'cache': cache}),
+            ('rating table', {'ratingTable': ratingTable}),
+            ('mapped rating table', {'ratingTable': ratingTable,
+                                     'workers': workers}),
+            ('catalogue', None)]
+
+
+def verify(configuration, top, workers, cacheDirectory):
+    # returns the names of the variants whose results differ from the
+    # reference
+    reference = solveReference(configuration, top)
+    failed = []
+    for name, options in getVariants(workers, cacheDirectory):
+        if options is None:
+            options = {'catalogue': catalogueHandler.catalogueHandler(
+                configuration)}
+        if priorityHandler.solve(configuration, top=top,
+                                 **options) != reference:
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compares the results of all strategies and options '
+                    'with a complete enumeration of random configurations.')
+    parser.add_argument('--configs', type=int, default=150,
+                        help='number of configurations (default: 150)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='number of processes of the parallel variant')
+    arguments = parser.parse_args()
+
+    generator = random.Random(arguments.seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as cacheDirectory:
+        for number in range(arguments.configs):
+            configuration = generateConfig(generator)
+            # the best combinations and the best three ones, which disables
+            # the pruning of dominated sessions
+            for top in [1, 3]:
+                failed = verify(configuration, top, arguments.workers,
+                                cacheDirectory)
+                if failed:
+                    print('Configuration {:d} (top {:d}) differs: {}'.format(
+                        number, top, ', '.join(failed)))
+                    failures += 1
+
+    if failures > 0:
+        sys.exit(1)
+    print('All {:d} configurations match the complete enumeration.'.format(
+        arguments.configs))
+
+if __name__ == '__main__':
+    main()